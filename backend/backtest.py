@@ -0,0 +1,187 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans
+from threadpoolctl import threadpool_limits
+
+from cluster_index import SAFE_HAVEN, ClusterIndex
+from correlation_analyzer import daily_returns
+from price_fetcher import load_price_history
+
+WINDOW_DAYS = 90
+# shortest training window worth clustering, shorter histories are rejected up front
+MIN_WINDOW_DAYS = 14
+STEP_DAYS = 1
+# days after each window over which the hedge advice is evaluated
+HORIZON_DAYS = 30
+# share rotated into Safe Haven, as in the "Rotate 15% into Safe Haven" advice
+HEDGE_FRACTION = 0.15
+N_CLUSTERS = 4
+N_INIT = 3
+RANDOM_STATE = 42
+TRADING_DAYS = 365
+
+# per-worker view of the shared returns matrix, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name, shape, dtype, tickers, config):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["returns"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["tickers"] = tickers
+    _worker["config"] = config
+
+    # one BLAS/OpenMP thread per process, the pool already uses every core
+    _worker["limits"] = threadpool_limits(1)
+
+
+def _max_drawdown(returns):
+    wealth = np.cumprod(1.0 + returns)
+    peaks = np.maximum.accumulate(wealth)
+    return float((1.0 - wealth / peaks).max())
+
+
+def _realized(returns):
+    if len(returns) < 2:
+        return np.nan, np.nan
+    return float(returns.std(ddof=1) * np.sqrt(TRADING_DAYS)), _max_drawdown(returns)
+
+
+# clusters one window and scores unhedged vs hedged equal-weight portfolios over the following horizon
+def _run_window(start):
+    returns = _worker["returns"]
+    tickers = _worker["tickers"]
+    config = _worker["config"]
+
+    end = start + config["window"]
+    block = returns[start:end].T
+
+    model = KMeans(n_clusters=config["n_clusters"], n_init=config["n_init"], random_state=config["random_state"])
+    labels = model.fit_predict(block)
+
+    index = ClusterIndex(pd.Series(labels, index=tickers))
+    safe = np.array([index.cluster_key[int(label)] == SAFE_HAVEN for label in labels])
+
+    risky_weights = np.where(~safe, 1.0, 0.0)
+    risky_weights /= max(risky_weights.sum(), 1.0)
+
+    hedged_weights = risky_weights.copy()
+    if safe.any():
+        hedged_weights = (1.0 - config["hedge_fraction"]) * risky_weights + config["hedge_fraction"] * safe / safe.sum()
+
+    forward = returns[end:end + config["horizon"]]
+    unhedged_vol, unhedged_dd = _realized(forward @ risky_weights)
+    hedged_vol, hedged_dd = _realized(forward @ hedged_weights)
+
+    return {
+        "start": start,
+        "labels": labels,
+        "n_iter": int(model.n_iter_),
+        "unhedged_vol": unhedged_vol,
+        "hedged_vol": hedged_vol,
+        "unhedged_drawdown": unhedged_dd,
+        "hedged_drawdown": hedged_dd,
+    }
+
+
+# relabels `labels` so they overlap `previous` as much as possible, returns (labels, transition matrix)
+def align_labels(previous, labels, n_clusters):
+    contingency = np.zeros((n_clusters, n_clusters), dtype=int)
+    np.add.at(contingency, (previous, labels), 1)
+
+    old_ids, new_ids = linear_sum_assignment(-contingency)
+    mapping = np.empty(n_clusters, dtype=int)
+    mapping[new_ids] = old_ids
+
+    aligned = mapping[labels]
+    transitions = np.zeros((n_clusters, n_clusters), dtype=int)
+    np.add.at(transitions, (previous, aligned), 1)
+    return aligned, transitions
+
+
+# walk-forward re-clustering over sliding windows, fanned out over a process pool
+# returns (per-window DataFrame, list of label-transition matrices between consecutive windows)
+def run_backtest(returns, window=WINDOW_DAYS, step=STEP_DAYS, horizon=HORIZON_DAYS,
+                 n_clusters=N_CLUSTERS, hedge_fraction=HEDGE_FRACTION, max_workers=None):
+    tickers = [str(ticker) for ticker in returns.columns]
+    dates = returns.index
+    matrix = np.ascontiguousarray(returns.to_numpy(dtype=np.float64))
+
+    starts = list(range(0, len(matrix) - window + 1, step))
+    if not starts:
+        raise ValueError(f"Need at least {window} days of returns, got {len(matrix)}.")
+
+    config = {
+        "window": window,
+        "horizon": horizon,
+        "n_clusters": n_clusters,
+        "n_init": N_INIT,
+        "random_state": RANDOM_STATE,
+        "hedge_fraction": hedge_fraction,
+    }
+
+    # one copy of the matrix in shared memory, every worker maps it instead of receiving pickles
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    try:
+        np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+
+        workers = max_workers or os.cpu_count()
+        chunksize = max(1, len(starts) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, matrix.shape, matrix.dtype, tickers, config)) as pool:
+            results = list(pool.map(_run_window, starts, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    rows = []
+    transitions = []
+    previous = None
+
+    for result in results:
+        labels = result.pop("labels")
+
+        stability = np.nan
+        if previous is not None:
+            labels, transition = align_labels(previous, labels, n_clusters)
+            transitions.append(transition)
+            stability = np.trace(transition) / len(labels)
+        previous = labels
+
+        start = result.pop("start")
+        rows.append({
+            "window_start": dates[start],
+            "window_end": dates[start + window - 1],
+            "label_stability": stability,
+            **result,
+        })
+
+    return pd.DataFrame(rows), transitions
+
+
+def main():
+    history = load_price_history()
+    if history is None:
+        print("No price history found. Run main.py first to fetch market data.")
+        return
+
+    returns = daily_returns(history)
+    window = min(WINDOW_DAYS, len(returns) // 2)
+    if window < MIN_WINDOW_DAYS:
+        print(f"Only {len(returns)} days of complete returns, need at least {2 * MIN_WINDOW_DAYS} to backtest.")
+        return
+
+    windows, _ = run_backtest(returns, window=window)
+
+    print(windows.to_string(index=False))
+    print(f"\nMean label stability: {windows['label_stability'].mean():.1%}")
+    print(f"Mean realized vol   : unhedged {windows['unhedged_vol'].mean():.1%} | hedged {windows['hedged_vol'].mean():.1%}")
+    print(f"Mean max drawdown   : unhedged {windows['unhedged_drawdown'].mean():.1%} | hedged {windows['hedged_drawdown'].mean():.1%}")
+
+if __name__ == "__main__":
+    main()
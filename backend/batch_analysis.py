@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from cluster_index import ALTCOINS, BLUE_CHIPS, HIGH_VOLATILITY, SAFE_HAVEN, THEME_KEYS, as_cluster_index
+
+# diagnoses in the order analyze_portfolio checks them, the first matching rule wins
+BARBELL = "Barbell"
+ALTCOIN_HEAVY = "Altcoin Heavy"
+HIGH_RISK = "High Risk Exposure"
+CONSERVATIVE = "Excessively Conservative"
+CONCENTRATION = "Heavy Concentration"
+LIQUIDITY_DANGER = "Liquidity Danger"
+HEALTHY = "Healthy Balance"
+EMPTY = "Empty"
+
+# theme whose cluster each diagnosis recommends rotating into
+DIAGNOSIS_TARGET = {
+    BARBELL: BLUE_CHIPS,
+    ALTCOIN_HEAVY: BLUE_CHIPS,
+    HIGH_RISK: SAFE_HAVEN,
+    CONSERVATIVE: BLUE_CHIPS,
+    CONCENTRATION: SAFE_HAVEN,
+    LIQUIDITY_DANGER: SAFE_HAVEN,
+}
+
+
+# sparse (portfolios x tickers) quantity matrix from a list of {ticker: quantity} dicts
+def holdings_matrix(portfolios, tickers):
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+
+    rows, cols, data = [], [], []
+    for row, portfolio in enumerate(portfolios):
+        for ticker, quantity in portfolio.items():
+            if ticker in column:
+                rows.append(row)
+                cols.append(column[ticker])
+                data.append(quantity)
+
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(portfolios), len(tickers)), dtype=np.float64)
+
+
+# prices aligned to tickers, 0 where no quote is known
+def price_vector(current_prices, tickers):
+    return np.array([current_prices.get(ticker, 0.0) for ticker in tickers], dtype=np.float64)
+
+
+# (tickers x themes) one-hot matrix, tickers outside the model get an all-zero row
+def theme_matrix(index, tickers):
+    matrix = np.zeros((len(tickers), len(THEME_KEYS)))
+    theme_column = {key: i for i, key in enumerate(THEME_KEYS)}
+
+    for row, ticker in enumerate(tickers):
+        if ticker in index:
+            matrix[row, theme_column[index.cluster_key[index.cluster_of(ticker)]]] = 1.0
+
+    return matrix
+
+
+# values and weights per holding as sparse matrices, plus the total value per portfolio
+def portfolio_values(holdings, prices):
+    values = sparse.csr_matrix(holdings.multiply(prices[np.newaxis, :]))
+    totals = np.asarray(values.sum(axis=1)).ravel()
+
+    inverse = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    weights = sparse.diags(inverse) @ values
+
+    return values, weights.tocsr(), totals
+
+
+# applies the analyze_portfolio decision tree to whole columns of theme percentages
+def diagnose(safe_pct, blue_chip_pct, vol_pct, alt_pct, totals):
+    conditions = [
+        totals <= 0,
+        (safe_pct > 30) & (vol_pct > 30) & (blue_chip_pct < 10),
+        alt_pct > 40,
+        vol_pct > 30,
+        safe_pct > 50,
+        blue_chip_pct > 90,
+        safe_pct < 5,
+    ]
+    choices = [EMPTY, BARBELL, ALTCOIN_HEAVY, HIGH_RISK, CONSERVATIVE, CONCENTRATION, LIQUIDITY_DANGER]
+
+    return np.select(conditions, choices, default=HEALTHY)
+
+
+# scores N portfolios at once: holdings is a (portfolios x tickers) sparse matrix, prices a ticker vector
+def analyze_portfolios(holdings, prices, clustered_coins, tickers):
+    index = as_cluster_index(clustered_coins)
+
+    # tickers outside the model are left out of the totals too, like analyze_portfolio skips them
+    known = np.array([ticker in index for ticker in tickers], dtype=np.float64)
+    holdings = sparse.csr_matrix(holdings) @ sparse.diags(known)
+
+    values, weights, totals = portfolio_values(sparse.csr_matrix(holdings), np.asarray(prices, dtype=np.float64))
+
+    exposure = np.asarray(values @ theme_matrix(index, tickers))
+    inverse = np.divide(100.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    pct = exposure * inverse[:, np.newaxis]
+
+    summary = pd.DataFrame(pct, columns=[f"{key} %" for key in THEME_KEYS])
+    summary.insert(0, "Total Value", totals)
+
+    columns = {key: pct[:, i] for i, key in enumerate(THEME_KEYS)}
+    diagnosis = diagnose(columns[SAFE_HAVEN], columns[BLUE_CHIPS], columns[HIGH_VOLATILITY], columns[ALTCOINS], totals)
+    summary["Diagnosis"] = diagnosis
+
+    target_cluster = {d: index.theme_cluster[theme] for d, theme in DIAGNOSIS_TARGET.items()}
+    summary["Target Cluster"] = pd.Series(diagnosis).map(target_cluster).fillna(-1).astype(int).to_numpy()
+
+    return {"summary": summary, "values": values, "weights": weights}
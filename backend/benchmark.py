@@ -0,0 +1,331 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+SIZES = [50, 500, 5000]
+BASELINE_FILE = "benchmark_baseline.json"
+# a stage regresses when it is this much slower than the baseline...
+TOLERANCE = 0.25
+# ...and at least this many seconds slower, so millisecond stages don't flap
+MIN_DELTA_SECONDS = 0.05
+# every Nth stub request answers 429 (with Retry-After: 0) to exercise the retry path, 0 disables it
+THROTTLE_EVERY = 200
+HISTORY_DAYS = 90
+PLOT_DPI = 100
+STABLECOINS = {"USDT", "USDC", "DAI", "FDUSD"}
+DAY_MS = 86_400_000
+
+
+# deterministic synthetic market behind CoinGecko's routes: /coins/markets, /coins/<id>/market_chart, /simple/price
+class StubMarket:
+    def __init__(self, coins, n_assets, throttle_every=THROTTLE_EVERY, seed=0):
+        self.listing = list(coins.items())
+        self.listing += [(f"B{i}", f"bench-{i}") for i in range(max(0, n_assets - len(self.listing)))]
+        self.symbols = {coin_id: symbol for symbol, coin_id in self.listing}
+
+        self.market = np.random.default_rng(seed).normal(0.0, 0.03, 4 * HISTORY_DAYS + 1)
+        self.series = {}
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def throttled(self):
+        with self.lock:
+            self.requests += 1
+            return self.throttle_every and self.requests % self.throttle_every == 0
+
+    def markets(self, page, per_page):
+        rows = self.listing[(page - 1) * per_page:page * per_page]
+        return [{"id": coin_id, "symbol": symbol.lower()} for symbol, coin_id in rows]
+
+    # every close the stub knows for a coin, oldest first and ending today, drawn once from the coin id
+    # beta * market + idiosyncratic noise, stablecoins pinned near 1
+    def _series(self, coin_id):
+        prices = self.series.get(coin_id)
+        if prices is None:
+            rng = np.random.default_rng(zlib.crc32(coin_id.encode()))
+            n = len(self.market)
+
+            if self.symbols.get(coin_id, "") in STABLECOINS:
+                prices = 1.0 + rng.normal(0.0, 0.0005, n)
+            else:
+                group = zlib.crc32(coin_id.encode()) % 4
+                beta, noise = [(0.8, 0.01), (1.0, 0.02), (1.5, 0.05), (2.5, 0.12)][group]
+                returns = beta * self.market + rng.normal(0.0, noise, n)
+                prices = rng.uniform(0.01, 1000) * np.cumprod(1.0 + np.clip(returns, -0.9, None))
+
+            self.series[coin_id] = prices
+        return prices
+
+    # one close per UTC day ending today, the tail of the coin's series so a date's price doesn't depend on days
+    def chart(self, coin_id, days):
+        prices = self._series(coin_id)
+        days = max(1, min(int(float(days)), len(prices) - 1))
+        today = int(time.time() * 1000) // DAY_MS * DAY_MS
+        stamps = today - np.arange(days, -1, -1) * DAY_MS
+
+        return {"prices": [[int(ms), float(price)] for ms, price in zip(stamps, prices[-len(stamps):])]}
+
+    def simple_price(self, ids):
+        return {coin_id: {"usd": float(self._series(coin_id)[-1])} for coin_id in ids if coin_id}
+
+
+def _handler(market):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if market.throttled():
+                return self.send_json(429, {"error": "rate limited"}, {"Retry-After": "0"})
+
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            parts = [part for part in url.path.split("/") if part]
+
+            if parts[-2:] == ["coins", "markets"]:
+                return self.send_json(200, market.markets(int(query.get("page", 1)), int(query.get("per_page", 250))))
+            if len(parts) >= 3 and parts[-1] == "market_chart":
+                return self.send_json(200, market.chart(parts[-2], query.get("days", HISTORY_DAYS)))
+            if parts[-2:] == ["simple", "price"]:
+                return self.send_json(200, market.simple_price(query.get("ids", "").split(",")))
+
+            self.send_json(404, {"error": f"no stub route for {url.path}"})
+
+    return Handler
+
+
+# serves the stub on a free localhost port from a daemon thread, returns (server, base url)
+def start_stub(market):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(market))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-api", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# runs every pipeline stage once for an n-asset universe, returns (seconds per stage, counters)
+def run_size(n_assets, base_url, auto_k=False):
+    import main
+    import metrics
+    import price_fetcher
+    from market_cache import publish_generation
+    from portfolio_visualizer import save_portfolio_scatterplot
+
+    price_fetcher.COIN_GECKO_BASE_URL = base_url
+    price_fetcher.UNIVERSE_SIZE = n_assets
+    price_fetcher._universe = None
+    price_fetcher.price_cache.clear()
+    main.AUTO_K = auto_k
+    metrics.reset()
+
+    stages = {}
+
+    @contextlib.contextmanager
+    def stage(name):
+        start = time.perf_counter()
+        yield
+        stages[name] = time.perf_counter() - start
+
+    with stage("discover_universe"):
+        universe = price_fetcher.get_universe(refresh=True)
+    with stage("fetch_history"):
+        points = price_fetcher.get_historical_prices()
+    with stage("parse_history"):
+        history = price_fetcher.prices_to_frame(points)
+    with stage("compute_returns"):
+        returns = price_fetcher.compute_returns(history)
+    with stage("publish_cache"):
+        publish_generation(returns, None, main.CACHE_DIR)
+    with stage("load_cache"), contextlib.redirect_stdout(io.StringIO()):
+        df, _ = main.get_market_data()
+    with stage("train_model"):
+        clusters = main.train_model(df)
+    with stage("train_model_cached"):
+        main.train_model(df)
+
+    holdings = {ticker: 1.0 for ticker in list(df.index)[:10]}
+    with stage("spot_prices"):
+        prices = price_fetcher.get_curr_prices(holdings)
+    with stage("spot_prices_cached"):
+        price_fetcher.get_curr_prices(holdings)
+    with stage("analyze_portfolio"), contextlib.redirect_stdout(io.StringIO()):
+        main.analyze_portfolio(holdings, prices, clusters, df, pause=0, plot=False)
+    with stage("save_portfolio_scatterplot"):
+        save_portfolio_scatterplot(df, clusters, list(holdings), output_dir="data/visualizations", dpi=PLOT_DPI)
+
+    counters = metrics.snapshot()["counters"]
+    counters["assets"] = len(df)
+    counters["universe"] = len(universe)
+    return stages, counters
+
+
+# every size in a scratch working directory against a fresh stub, returns the results document
+def run_benchmarks(sizes=SIZES, throttle_every=THROTTLE_EVERY, auto_k=False):
+    workdir = tempfile.mkdtemp(prefix="fulcrum-bench-")
+    previous_dir = os.getcwd()
+
+    # the fetcher reads these at import time, so they are set before any pipeline module loads
+    os.environ.setdefault("COIN_GECKO_RATE_LIMIT", "1000000")
+    os.environ["FULCRUM_HTTP_CACHE_DIR"] = os.path.join(workdir, "data", "http_cache")
+    os.environ.pop("FULCRUM_OFFLINE", None)
+
+    results = {}
+    try:
+        os.chdir(workdir)
+        os.makedirs("data", exist_ok=True)
+
+        from price_fetcher import COINS
+
+        for n_assets in sizes:
+            # each size gets its own stub and an empty data directory
+            shutil.rmtree("data", ignore_errors=True)
+            os.makedirs("data")
+
+            server, base_url = start_stub(StubMarket(COINS, n_assets, throttle_every))
+            try:
+                print(f"Benchmarking {n_assets} assets...", file=sys.stderr)
+                stages, counters = run_size(n_assets, base_url, auto_k)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+            results[str(n_assets)] = {"stages": stages, "counters": counters}
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "auto_k": auto_k,
+        "results": results,
+    }
+
+
+# [(field, baseline value, this machine's value)] for the hardware fields that differ from the baseline's
+def machine_mismatch(baseline):
+    current = {"machine": platform.machine(), "cpus": os.cpu_count()}
+    return [(field, baseline.get(field), value) for field, value in current.items() if baseline.get(field) != value]
+
+
+# [(size, stage, baseline seconds, current seconds)] for every stage slower than the tolerance allows
+def find_regressions(baseline, current, tolerance=TOLERANCE, min_delta=MIN_DELTA_SECONDS):
+    regressions = []
+    for size, result in current["results"].items():
+        reference = baseline.get("results", {}).get(size)
+        if reference is None:
+            continue
+
+        for name, seconds in result["stages"].items():
+            before = reference["stages"].get(name)
+            if before is None:
+                continue
+            if seconds > before * (1 + tolerance) and seconds - before > min_delta:
+                regressions.append((size, name, before, seconds))
+
+    return regressions
+
+
+def print_results(current, baseline=None):
+    for size, result in current["results"].items():
+        reference = (baseline or {}).get("results", {}).get(size, {}).get("stages", {})
+
+        print(f"\n=== {size} assets ({result['counters']['assets']} in the returns matrix) ===")
+        print(f"{'STAGE':<28} | {'SECONDS':>9} | {'BASELINE':>9} | {'CHANGE'}")
+        print(f"{'-'*62}")
+        for name, seconds in result["stages"].items():
+            before = reference.get(name)
+            change = f"{(seconds / before - 1):+.0%}" if before else ""
+            before_text = f"{before:9.3f}" if before is not None else f"{'-':>9}"
+            print(f"{name:<28} | {seconds:9.3f} | {before_text} | {change}")
+
+        counters = ", ".join(f"{name}={value}" for name, value in sorted(result["counters"].items()))
+        print(f"counters: {counters}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic universes against a local stub API.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), BASELINE_FILE))
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--output", help="also write this run's results as JSON")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--throttle-every", type=int, default=THROTTLE_EVERY)
+    parser.add_argument("--auto-k", action="store_true", help="include automatic k selection in train_model")
+    parser.add_argument("--any-machine", action="store_true",
+                        help="compare against a baseline recorded on different hardware anyway")
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    # absolute timings from other hardware would flag (or hide) regressions that aren't there
+    mismatch = machine_mismatch(baseline) if baseline is not None and not args.save_baseline else []
+    if mismatch and not args.any_machine:
+        differences = ", ".join(f"{field} {before} vs {value}" for field, before, value in mismatch)
+        print(f"Baseline at {baseline_path} was recorded on different hardware ({differences}). "
+              f"Record one here with --save-baseline, or pass --any-machine to compare anyway.")
+        return 1
+
+    current = run_benchmarks(args.sizes, args.throttle_every, args.auto_k)
+    print_results(current, baseline)
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+
+    # a missing baseline fails the run so the regression check can't pass silently
+    if baseline is None:
+        print(f"\nNo baseline at {baseline_path}, run with --save-baseline to record one.")
+        return 1
+
+    regressions = find_regressions(baseline, current, args.tolerance)
+    for size, name, before, seconds in regressions:
+        print(f"REGRESSION: {name} at {size} assets took {seconds:.3f}s (baseline {before:.3f}s, +{seconds / before - 1:.0%})")
+
+    if not regressions:
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+SAFE_HAVEN = "Safe Haven"
+BLUE_CHIPS = "Blue Chips"
+HIGH_VOLATILITY = "High Volatility"
+ALTCOINS = "Altcoins"
+
+THEME_KEYS = [SAFE_HAVEN, BLUE_CHIPS, HIGH_VOLATILITY, ALTCOINS]
+
+THEMES = {
+    SAFE_HAVEN: "Safe Haven (Stablecoins)",
+    BLUE_CHIPS: "Blue Chips (L1s & Majors)",
+    HIGH_VOLATILITY: "High Volatility (Memes & Speculative)",
+    ALTCOINS: "Altcoins (Mid-Cap)",
+}
+
+# number of example tickers shown per hedge suggestion
+HEDGE_CANDIDATES = 5
+
+
+# theme key for a cluster given its members, anchored on well known coins
+def classify_members(members):
+    # Stables
+    if "USDC" in members or "USDT" in members:
+        return SAFE_HAVEN
+
+    # Major Alts
+    if "ETH" in members or "SOL" in members:
+        return BLUE_CHIPS
+
+    # Memes & speculative
+    if "PEPE" in members or "DOGE" in members:
+        return HIGH_VOLATILITY
+
+    # Broad Altcoin market
+    return ALTCOINS
+
+
+# every lookup the recommenders need, computed once per trained model
+class ClusterIndex:
+    def __init__(self, clustered_coins):
+        self.clustered_coins = clustered_coins
+
+        self.ticker_cluster = {ticker: int(c_id) for ticker, c_id in clustered_coins.items()}
+
+        members = {}
+        for ticker, c_id in self.ticker_cluster.items():
+            members.setdefault(c_id, []).append(ticker)
+        self.cluster_members = {c_id: tuple(tickers) for c_id, tickers in members.items()}
+
+        self.cluster_key = {c_id: classify_members(set(tickers)) for c_id, tickers in self.cluster_members.items()}
+        self.cluster_theme = {c_id: THEMES[key] for c_id, key in self.cluster_key.items()}
+
+        # largest cluster carrying each theme (first in order of appearance on ties), -1 if none does
+        # with more than four clusters a theme can be shared, and the largest offers the most hedge options
+        self.theme_cluster = {key: -1 for key in THEME_KEYS}
+        for c_id, key in self.cluster_key.items():
+            current = self.theme_cluster[key]
+            if current == -1 or len(self.cluster_members[c_id]) > len(self.cluster_members[current]):
+                self.theme_cluster[key] = c_id
+
+        self.hedge_candidates = {
+            key: list(self.cluster_members[c_id][:HEDGE_CANDIDATES]) if c_id != -1 else []
+            for key, c_id in self.theme_cluster.items()
+        }
+
+    def __contains__(self, ticker):
+        return ticker in self.ticker_cluster
+
+    def cluster_of(self, ticker):
+        return self.ticker_cluster[ticker]
+
+    def theme_of(self, ticker):
+        return self.cluster_theme[self.ticker_cluster[ticker]]
+
+
+# lets callers pass either a trained index or the raw clustered_coins series
+def as_cluster_index(clusters):
+    if isinstance(clusters, ClusterIndex):
+        return clusters
+    return ClusterIndex(clusters)
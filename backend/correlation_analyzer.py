@@ -1,26 +1,138 @@
+from collections import deque
+
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-prices = pd.read_csv("data/prices_original.csv")
-prices = prices.drop(columns=['date'])
-
-correlation_matrix = prices.corr()
-
-# correlation heatmap
-plt.figure(figsize=(20, 16))
-sns.heatmap(correlation_matrix,
-            annot=True,
-            fmt='.2f',
-            cmap='coolwarm',
-            center=0,
-            square=True,
-            linewidths=2,
-            cbar_kws={"shrink": 0.8},
-            annot_kws={"size": 8})
-plt.title('Cryptocurrency Price Correlation Heatmap', fontsize=16, pad=20)
-plt.xticks(rotation=45, ha='right', fontsize=10)
-plt.yticks(rotation=0, fontsize=10)
-plt.tight_layout()
-plt.savefig('data/correlation_heatmap.png', dpi=300, bbox_inches='tight')
-plt.show()
\ No newline at end of file
+
+from heatmap_renderer import save_heatmap
+from market_cache import CACHE_DIR, load_generation
+from price_fetcher import MIN_COVERAGE, load_price_history
+
+WINDOW_DAYS = 30
+# running sums are rebuilt from the buffer this often to stop float error from accumulating
+RECOMPUTE_EVERY = 500
+
+
+# sliding-window correlation over daily returns, updated in O(n^2) per appended day
+class RollingCorrelation:
+    def __init__(self, tickers, window=WINDOW_DAYS, keep_history=False):
+        self.tickers = list(tickers)
+        self.window = window
+        self.keep_history = keep_history
+
+        n = len(self.tickers)
+        self.buffer = deque()
+        self.dates = deque()
+        self.sum = np.zeros(n)
+        self.outer_sum = np.zeros((n, n))
+        self.updates = 0
+        self.history = {}
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def is_full(self):
+        return len(self.buffer) == self.window
+
+    # adds one day of returns (one value per ticker) and drops the oldest day once the window is full
+    def append(self, date, returns):
+        returns = np.asarray(returns, dtype=np.float64)
+
+        self.buffer.append(returns)
+        self.dates.append(date)
+        self.sum += returns
+        self.outer_sum += np.outer(returns, returns)
+
+        if len(self.buffer) > self.window:
+            oldest = self.buffer.popleft()
+            self.dates.popleft()
+            self.sum -= oldest
+            self.outer_sum -= np.outer(oldest, oldest)
+
+        self.updates += 1
+        if self.updates % RECOMPUTE_EVERY == 0:
+            self._recompute()
+
+        if self.keep_history and self.is_full():
+            self.history[date] = self.correlation().astype(np.float32)
+
+    def _recompute(self):
+        block = np.array(self.buffer)
+        self.sum = block.sum(axis=0)
+        self.outer_sum = block.T @ block
+
+    def mean(self):
+        return self.sum / len(self.buffer)
+
+    def covariance(self):
+        m = len(self.buffer)
+        return (self.outer_sum - np.outer(self.sum, self.sum) / m) / (m - 1)
+
+    def correlation(self):
+        cov = self.covariance()
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        scale = np.outer(std, std)
+        corr = np.divide(cov, scale, out=np.zeros_like(cov), where=scale > 0)
+        return np.clip(corr, -1.0, 1.0)
+
+    def correlation_frame(self):
+        return pd.DataFrame(self.correlation(), index=self.tickers, columns=self.tickers)
+
+    # correlation matrix of the window ending on date (needs keep_history=True)
+    def matrix_at(self, date):
+        return pd.DataFrame(self.history[date], index=self.tickers, columns=self.tickers)
+
+
+# daily % returns (dates x tickers) from the stored price history, dropping incomplete days
+# gaps are not forward-filled, which would turn them into fake 0% returns
+# tickers missing too many days (new listings, delisted coins) are dropped first so they don't take those dates away from everyone
+def daily_returns(history, min_coverage=MIN_COVERAGE):
+    returns = history.pct_change(fill_method=None).iloc[1:].dropna(how="all")
+
+    keep = returns.notna().mean() >= min_coverage
+    return returns.loc[:, keep].dropna()
+
+
+# streams returns through the engine, yields (date, correlation matrix, drift vs the previous window)
+def rolling_correlations(returns, window=WINDOW_DAYS):
+    engine = RollingCorrelation(returns.columns, window)
+    previous = None
+
+    for date, row in zip(returns.index, returns.to_numpy()):
+        engine.append(date, row)
+        if not engine.is_full():
+            continue
+
+        corr = engine.correlation()
+        drift = float(np.linalg.norm(corr - previous) / len(corr)) if previous is not None else 0.0
+        previous = corr
+
+        yield date, corr, drift
+
+
+def main():
+    history = load_price_history()
+    if history is None:
+        print("No price history found. Run main.py first to fetch market data.")
+        return
+
+    returns = daily_returns(history)
+
+    latest = None
+    for date, corr, drift in rolling_correlations(returns):
+        print(f"{pd.Timestamp(date).date()}  correlation drift: {drift:.4f}")
+        latest = corr
+
+    if latest is None:
+        print(f"Not enough history for a {WINDOW_DAYS}-day window.")
+        return
+
+    # group the heatmap by the latest KMeans clusters when a trained model is cached
+    _, clusters = load_generation(CACHE_DIR)
+    corr = pd.DataFrame(latest, index=returns.columns, columns=returns.columns)
+    if clusters is not None and not corr.index.isin(clusters.index).all():
+        clusters = None
+
+    save_heatmap(corr, labels=clusters)
+
+if __name__ == "__main__":
+    main()
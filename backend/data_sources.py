@@ -0,0 +1,272 @@
+import argparse
+import os
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from ingest import GRANULARITY_MS
+from metrics import increment, timed
+
+# rows read per chunk, peak memory scales with this and the (days x tickers) output, not the file size
+CHUNK_ROWS = 1_000_000
+# accepted column names per field, first match wins (case-insensitive)
+COLUMN_CANDIDATES = {
+    "ticker": ("ticker", "symbol", "asset", "coin", "pair"),
+    "timestamp": ("timestamp", "time", "date", "datetime", "open_time", "close_time"),
+    "close": ("close", "price", "close_price", "last"),
+}
+# epoch values above this are milliseconds, below it seconds
+EPOCH_MS_THRESHOLD = 100_000_000_000
+
+
+def _resolve_columns(names, columns=None):
+    lookup = {str(name).lower(): name for name in names}
+    resolved = {}
+
+    for field, candidates in COLUMN_CANDIDATES.items():
+        if columns and field in columns:
+            resolved[field] = columns[field]
+            continue
+
+        match = next((lookup[c] for c in candidates if c in lookup), None)
+        if match is None:
+            raise ValueError(f"No {field} column found in {list(names)} (pass columns={{'{field}': ...}}).")
+        resolved[field] = match
+
+    return resolved
+
+
+# OHLCV dump read as a stream of DataFrame chunks; subclasses implement column_names and chunks
+class DumpSource(ABC):
+    def __init__(self, path, columns=None, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+
+    @abstractmethod
+    def column_names(self):
+        ...
+
+    @abstractmethod
+    def chunks(self, usecols):
+        ...
+
+    # yields DataFrames holding only the ticker, timestamp and close columns, renamed to those fields
+    def __iter__(self):
+        resolved = _resolve_columns(self.column_names(), self.columns)
+        rename = {column: field for field, column in resolved.items()}
+
+        for chunk in self.chunks(list(resolved.values())):
+            yield chunk.rename(columns=rename)
+
+
+class CsvDumpSource(DumpSource):
+    def column_names(self):
+        return pd.read_csv(self.path, nrows=0).columns
+
+    def chunks(self, usecols):
+        yield from pd.read_csv(self.path, usecols=usecols, chunksize=self.chunk_rows)
+
+
+# needs pyarrow, which is only imported when a Parquet dump is opened
+class ParquetDumpSource(DumpSource):
+    def _file(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet dumps needs pyarrow (pip install pyarrow).")
+        return pq.ParquetFile(self.path)
+
+    def column_names(self):
+        return self._file().schema_arrow.names
+
+    def chunks(self, usecols):
+        for batch in self._file().iter_batches(batch_size=self.chunk_rows, columns=usecols):
+            yield batch.to_pandas()
+
+
+SOURCES = {
+    ".csv": CsvDumpSource,
+    ".gz": CsvDumpSource,
+    ".parquet": ParquetDumpSource,
+    ".pq": ParquetDumpSource,
+}
+
+
+# picks the source class from the file extension (or an explicit format like "csv")
+def open_source(path, fmt=None, **kwargs):
+    key = f".{fmt}" if fmt else os.path.splitext(path)[1].lower()
+    if key not in SOURCES:
+        raise ValueError(f"No data source for {path} (known: {', '.join(sorted(SOURCES))}).")
+    return SOURCES[key](path, **kwargs)
+
+
+# timestamps of any common dump format -> int64 epoch ms (UTC)
+def to_epoch_ms(values):
+    if pd.api.types.is_numeric_dtype(values):
+        ms = np.asarray(values, dtype=np.float64)
+        if len(ms) and np.nanmax(ms) < EPOCH_MS_THRESHOLD:
+            ms = ms * 1000
+        return ms.astype(np.int64)
+
+    # timedelta arithmetic rather than astype("int64"), which depends on the parsed resolution
+    stamps = pd.to_datetime(values, utc=True)
+    return np.asarray((stamps - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1), dtype=np.int64)
+
+
+# chunk -> (ticker strings, epoch ms, close), dropping rows without a usable close
+def normalize_chunks(chunks):
+    for chunk in chunks:
+        close = pd.to_numeric(chunk["close"], errors="coerce").to_numpy(dtype=np.float64)
+        keep = np.isfinite(close) & chunk["ticker"].notna().to_numpy() & chunk["timestamp"].notna().to_numpy()
+        if not keep.any():
+            continue
+
+        chunk = chunk[keep]
+        yield (chunk["ticker"].astype(str).str.upper().to_numpy(),
+               to_epoch_ms(chunk["timestamp"]),
+               close[keep])
+
+
+# streaming resampler: keeps only the latest close per (bucket, ticker) in a growing dense matrix
+class CloseAccumulator:
+    def __init__(self, granularity="daily"):
+        self.width = GRANULARITY_MS[granularity]
+        self.columns = {}
+        self.origin = None
+        self.closes = np.empty((0, 0))
+        self.stamps = np.empty((0, 0), dtype=np.int64)
+        self.rows_seen = 0
+
+    # makes room for buckets first..last and n_columns tickers, with geometric headroom on every side
+    def _grow(self, first, last, n_columns):
+        capacity_rows, capacity_cols = self.closes.shape
+        if self.origin is None:
+            self.origin = first
+
+        shift = 0
+        if first < self.origin:
+            shift = self.origin - first + capacity_rows // 2
+        needed_rows = max(capacity_rows + shift, last - (self.origin - shift) + 1)
+
+        if shift == 0 and needed_rows <= capacity_rows and n_columns <= capacity_cols:
+            return
+
+        rows = needed_rows if needed_rows <= capacity_rows + shift else max(needed_rows, capacity_rows + shift + capacity_rows // 2)
+        cols = max(n_columns, capacity_cols + capacity_cols // 2) if n_columns > capacity_cols else capacity_cols
+
+        closes = np.full((rows, cols), np.nan)
+        stamps = np.full((rows, cols), np.iinfo(np.int64).min, dtype=np.int64)
+        closes[shift:shift + capacity_rows, :capacity_cols] = self.closes
+        stamps[shift:shift + capacity_rows, :capacity_cols] = self.stamps
+
+        self.closes, self.stamps = closes, stamps
+        self.origin -= shift
+
+    def add(self, tickers, ms, close):
+        self.rows_seen += len(ms)
+        increment("rows_ingested", len(ms))
+
+        uniques, codes = np.unique(tickers, return_inverse=True)
+        mapping = np.array([self.columns.setdefault(t, len(self.columns)) for t in uniques], dtype=np.intp)
+        cols = mapping[codes]
+
+        buckets = ms // self.width
+        self._grow(int(buckets.min()), int(buckets.max()), len(self.columns))
+        rows = buckets - self.origin
+
+        # latest point per (row, col) inside the chunk: sort by cell then time, keep each run's last entry
+        cell = rows * self.closes.shape[1] + cols
+        order = np.lexsort((ms, cell))
+        cell = cell[order]
+        last = np.flatnonzero(np.diff(cell, append=cell[-1] + 1))
+        picked = order[last]
+
+        r, c = rows[picked], cols[picked]
+        newer = ms[picked] >= self.stamps[r, c]
+        self.closes[r[newer], c[newer]] = close[picked][newer]
+        self.stamps[r[newer], c[newer]] = ms[picked][newer]
+
+    # closes (buckets x tickers) like prices_to_frame, buckets with no data at all are dropped
+    def to_frame(self):
+        if self.origin is None:
+            return pd.DataFrame()
+
+        tickers = list(self.columns)
+        closes = self.closes[:, :len(tickers)]
+        present = ~np.isnan(closes).all(axis=1)
+
+        index = (np.flatnonzero(present) + self.origin) * self.width
+        frame = pd.DataFrame(closes[present], index=pd.to_datetime(index, unit="ms"), columns=tickers)
+        frame.index.name = "date"
+        return frame
+
+
+# streams a dump through normalize -> resample and returns the closes (buckets x tickers)
+@timed()
+def read_closes(source, granularity="daily"):
+    accumulator = CloseAccumulator(granularity)
+    for tickers, ms, close in normalize_chunks(source):
+        accumulator.add(tickers, ms, close)
+    return accumulator.to_frame()
+
+
+# ingests a dump into the price history and publishes a new market-data cache generation
+# stored closes win over the dump's on days both have; returns the published generation path
+def ingest_dump(path, fmt=None, columns=None, chunk_rows=CHUNK_ROWS, window=None, publish=True):
+    from main import CACHE_DIR, train_model
+    from market_cache import acquire_refresh_lock, load_generation, publish_generation, release_refresh_lock
+    from price_fetcher import HISTORY_DAYS, compute_returns, load_price_history, record_ingested_tickers, save_price_history
+    from returns_matrix import as_returns_matrix
+
+    closes = read_closes(open_source(path, fmt, columns=columns, chunk_rows=chunk_rows))
+    if closes.empty:
+        raise ValueError(f"No prices found in {path}.")
+
+    # the merge into the stored history is a read-modify-write, so it holds the refresh lock like an API refresh
+    token = acquire_refresh_lock(CACHE_DIR)
+    while token is None:
+        time.sleep(1)
+        token = acquire_refresh_lock(CACHE_DIR)
+
+    try:
+        history = load_price_history()
+        if history is not None and not history.empty:
+            closes = history.combine_first(closes).sort_index()
+        save_price_history(closes)
+        # keeps dump-only tickers in the returns that later API refreshes compute
+        record_ingested_tickers(closes.columns)
+
+        if not publish:
+            return None
+
+        _, previous_clusters = load_generation(CACHE_DIR)
+        returns = as_returns_matrix(compute_returns(closes, window or HISTORY_DAYS, tickers=list(closes.columns)))
+        clusters = train_model(returns, previous_clusters=previous_clusters)
+        return publish_generation(returns, clusters, CACHE_DIR)
+    finally:
+        release_refresh_lock(token, CACHE_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a CSV/Parquet OHLCV dump into the market-data cache.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(key.lstrip(".") for key in SOURCES), default=None)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--window", type=int, default=None, help="days of returns to train on")
+    parser.add_argument("--ticker-column")
+    parser.add_argument("--time-column")
+    parser.add_argument("--close-column")
+    parser.add_argument("--no-publish", action="store_true", help="only update the price history")
+    args = parser.parse_args()
+
+    columns = {field: value for field, value in
+               (("ticker", args.ticker_column), ("timestamp", args.time_column), ("close", args.close_column)) if value}
+
+    generation = ingest_dump(args.path, args.format, columns or None, args.chunk_rows, args.window,
+                             publish=not args.no_publish)
+    print(f"Ingested {args.path}" + (f" into {generation}" if generation else ""))
+
+if __name__ == "__main__":
+    main()
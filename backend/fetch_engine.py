@@ -0,0 +1,224 @@
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from response_cache import OfflineCacheMiss, cache_from_env
+
+# requests per minute allowed on each CoinGecko plan
+RATE_LIMITS = {
+    "demo": 30,
+    "analyst": 500,
+    "lite": 500,
+    "pro": 1000,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_WORKERS = 8
+DEFAULT_BURST = 5
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+# token bucket shared by every worker so the whole refresh respects the plan limit
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst=DEFAULT_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# builds a limiter from COIN_GECKO_RATE_LIMIT, falling back to the COIN_GECKO_PLAN tier
+def limiter_from_env():
+    rate = os.getenv("COIN_GECKO_RATE_LIMIT")
+    if rate:
+        return TokenBucket(float(rate))
+
+    plan = os.getenv("COIN_GECKO_PLAN", "demo").lower()
+    return TokenBucket(RATE_LIMITS.get(plan, RATE_LIMITS["demo"]))
+
+
+def make_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_shared_lock = threading.Lock()
+_shared_session = None
+_shared_limiter = None
+_shared_cache = None
+
+
+# process-wide pooled session so keep-alive connections are reused between calls
+def get_session():
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = make_session()
+        return _shared_session
+
+
+# process-wide limiter so every caller draws from the same plan budget
+def get_limiter():
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = limiter_from_env()
+        return _shared_limiter
+
+
+# process-wide on-disk response cache (offline replay when FULCRUM_OFFLINE is set)
+def get_response_cache():
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = cache_from_env()
+        return _shared_cache
+
+
+def set_response_cache(cache):
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = cache
+
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS)
+
+    # exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def parse_retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# GETs a JSON payload, waiting on the limiter before every attempt and retrying 429/5xx
+def request_json(session, url, params=None, limiter=None, max_retries=MAX_RETRIES, headers=None):
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+
+        try:
+            metrics.increment("api_calls")
+            response = session.get(url, params=params, headers=headers, timeout=30)
+
+            if response.status_code == 429:
+                metrics.increment("http_429")
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableStatus(response.status_code, parse_retry_after(response))
+
+            response.raise_for_status()
+            return response
+
+        except (RetryableStatus, requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= max_retries:
+                raise
+
+            retry_after = e.retry_after if isinstance(e, RetryableStatus) else None
+            metrics.increment("api_retries")
+            time.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+
+# like request_json, but answered from the response cache while fresh (always, when offline),
+# revalidated with ETag/Last-Modified when stale, and falling back to the stale copy if the API fails
+def fetch_json(session, url, params=None, limiter=None, max_retries=MAX_RETRIES, cache=None):
+    if cache is None:
+        return request_json(session, url, params, limiter, max_retries).json()
+
+    entry = cache.get(url, params)
+
+    if entry is not None and (cache.offline or cache.is_fresh(url, entry)):
+        metrics.increment("http_cache_hits")
+        return entry["body"]
+
+    metrics.increment("http_cache_misses")
+
+    if cache.offline:
+        raise OfflineCacheMiss(f"no recorded response for {url} {params}")
+
+    headers = cache.revalidation_headers(entry) if entry is not None else None
+
+    try:
+        response = request_json(session, url, params, limiter, max_retries, headers)
+    except Exception as e:
+        if entry is None:
+            raise
+        print(f"Using cached response for {url} after error : {e}", file=sys.stderr)
+        return entry["body"]
+
+    if response.status_code == 304 and entry is not None:
+        metrics.increment("http_cache_revalidated")
+        cache.touch(url, params, entry)
+        return entry["body"]
+
+    body = response.json()
+    cache.put(url, params, body, response.headers)
+    return body
+
+# fetches {key: (url, params)} concurrently, returns {key: payload} for every request that succeeded
+def fetch_all(jobs, limiter=None, max_workers=MAX_WORKERS, session=None, cache=None):
+    if limiter is None:
+        limiter = get_limiter()
+
+    if session is None:
+        session = get_session()
+
+    if cache is None:
+        cache = get_response_cache()
+
+    results = {}
+
+    def run(key, url, params):
+        try:
+            results[key] = fetch_json(session, url, params, limiter, cache=cache)
+        except Exception as e:
+            print(f"Error finding prices for {key} : {e}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for key, (url, params) in jobs.items():
+            pool.submit(run, key, url, params)
+
+    return results
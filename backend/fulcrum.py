@@ -0,0 +1,140 @@
+import argparse
+import json
+import sys
+
+# only light modules at import time: sklearn and matplotlib are pulled in by the commands that need them
+from main import CACHE_DIR, analyze_portfolio, get_hedge_rec, get_market_data, hedge_summary, portfolio_summary, train_model
+from market_cache import load_generation
+import metrics
+
+
+# cached returns and clusters; only trains (or fetches) when the cache has none
+def load_model_state(refresh_if_missing=True):
+    df, clusters = load_generation(CACHE_DIR)
+
+    if df is None:
+        if not refresh_if_missing:
+            raise SystemExit("No market data cached. Run `python fulcrum.py refresh` first.")
+        df, clusters = get_market_data()
+
+    if clusters is None:
+        clusters = train_model(df)
+
+    return df, clusters
+
+
+# holdings from a JSON file ("-" for stdin), either {"BTC": 0.5} or {"holdings": {"BTC": 0.5}}
+def load_holdings(path):
+    if path == "-":
+        data = json.load(sys.stdin)
+    else:
+        with open(path) as f:
+            data = json.load(f)
+
+    holdings = data.get("holdings", data)
+    return {str(ticker).upper(): float(amount) for ticker, amount in holdings.items()}
+
+
+def hedge_command(args):
+    from hedge_index import HedgeIndex
+
+    df, clusters = load_model_state()
+    ticker = args.ticker.upper()
+    hedge_index = HedgeIndex(df)
+
+    if args.format == "json":
+        summary = hedge_summary(ticker, clusters, hedge_index)
+        if summary is None:
+            print(json.dumps({"error": f"{ticker} not found in database"}))
+            return 1
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    result = get_hedge_rec(ticker, clusters, hedge_index)
+    if result is not None:
+        print(result)
+        return 1
+    return 0
+
+
+def portfolio_command(args):
+    from price_fetcher import get_curr_prices
+
+    df, clusters = load_model_state()
+    holdings = load_holdings(args.holdings)
+    prices = get_curr_prices(holdings.keys())
+
+    if args.format == "json":
+        from hedge_optimizer import HedgeOptimizer
+        from risk_engine import RiskEngine
+
+        engine = RiskEngine(df)
+        summary = portfolio_summary(holdings, prices, clusters, hedge_optimizer=HedgeOptimizer(engine))
+        summary["risk"] = engine.report(holdings, prices, n_paths=args.mc_paths)
+        if args.plot:
+            from portfolio_visualizer import save_portfolio_scatterplot
+            summary["visualization"] = save_portfolio_scatterplot(df, clusters, list(holdings))
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    analyze_portfolio(holdings, prices, clusters, df, pause=0, plot=args.plot)
+    return 0
+
+
+def visualize_command(args):
+    from portfolio_visualizer import save_portfolio_scatterplot
+
+    df, clusters = load_model_state()
+    print(save_portfolio_scatterplot(df, clusters, list(load_holdings(args.holdings))))
+    return 0
+
+
+def refresh_command(args):
+    from main import refresh_market_data
+
+    if not refresh_market_data(wait=True):
+        print("Refresh failed.")
+        return 1
+
+    df, clusters = load_generation(CACHE_DIR)
+    print(f"Cached {df.shape[0]} assets x {df.shape[1]} days.")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="fulcrum", description="Crypto hedge and portfolio analysis.")
+    parser.add_argument("--metrics", choices=["json", "prometheus"], help="print timings and counters to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    hedge = commands.add_parser("hedge", help="hedge recommendations for a single asset")
+    hedge.add_argument("ticker")
+    hedge.add_argument("--format", choices=["text", "json"], default="text")
+    hedge.set_defaults(run=hedge_command)
+
+    portfolio = commands.add_parser("portfolio", help="analyze a portfolio from a JSON holdings file")
+    portfolio.add_argument("holdings", help='JSON file like {"BTC": 0.5, "ETH": 2}, or - for stdin')
+    portfolio.add_argument("--format", choices=["text", "json"], default="text")
+    portfolio.add_argument("--plot", action="store_true", help="also save the cluster scatterplot")
+    portfolio.add_argument("--mc-paths", type=int, default=0, help="Monte Carlo VaR/CVaR paths (json output)")
+    portfolio.set_defaults(run=portfolio_command)
+
+    visualize = commands.add_parser("visualize", help="save the cluster scatterplot for a portfolio")
+    visualize.add_argument("holdings")
+    visualize.set_defaults(run=visualize_command)
+
+    refresh = commands.add_parser("refresh", help="fetch new market data and retrain now")
+    refresh.set_defaults(run=refresh_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.run(args)
+    finally:
+        if args.metrics:
+            print(metrics.export(args.metrics), file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+# cells get a value annotation only up to this many assets
+ANNOTATE_MAX = 30
+# ticker tick labels up to this many assets, beyond that they are unreadable anyway
+TICK_LABEL_MAX = 120
+# assets per tile when writing zoomed views of a large universe
+TILE_SIZE = 100
+# figure side in inches is clamped so the pixel count (and render time) stays bounded
+MIN_INCHES = 8
+MAX_INCHES = 20
+DPI = 150
+CMAP = 'coolwarm'
+
+
+# hierarchical (average linkage) order on the correlation distance 1 - corr
+def hierarchical_order(corr):
+    n = len(corr)
+    if n < 3:
+        return np.arange(n)
+
+    distance = np.clip(1.0 - corr, 0.0, 2.0)
+    distance = (distance + distance.T) / 2
+    np.fill_diagonal(distance, 0.0)
+
+    tree = linkage(squareform(distance, checks=False), method='average')
+    return leaves_list(tree)
+
+
+# asset order for the heatmap: grouped by KMeans label when given, hierarchical within each group
+def cluster_order(corr, labels=None):
+    corr = np.asarray(corr, dtype=np.float64)
+    if labels is None:
+        return hierarchical_order(corr)
+
+    labels = np.asarray(labels)
+    order = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        order.extend(members[hierarchical_order(corr[np.ix_(members, members)])])
+    return np.array(order)
+
+
+# reordered copy of a correlation DataFrame, labels (optional) is a Series keyed by ticker
+def reorder(correlation_matrix, labels=None):
+    if labels is not None:
+        labels = pd.Series(labels).reindex(correlation_matrix.index).to_numpy()
+
+    order = cluster_order(correlation_matrix.to_numpy(), labels)
+    tickers = correlation_matrix.index[order]
+    ordered = correlation_matrix.iloc[order, order]
+    return ordered, (None if labels is None else pd.Series(labels[order], index=tickers))
+
+
+def _figure_inches(n):
+    return float(np.clip(n * 0.3, MIN_INCHES, MAX_INCHES))
+
+
+# draws one (rows x cols) block of the matrix as a single raster image
+def _draw_block(block, row_names, col_names, title, labels=None):
+    n_rows, n_cols = block.shape
+    inches = _figure_inches(max(n_rows, n_cols))
+
+    fig = Figure(figsize=(inches * 1.15, inches))
+    ax = fig.add_subplot()
+    image = ax.imshow(block, cmap=CMAP, vmin=-1.0, vmax=1.0, interpolation='nearest', aspect='equal')
+    fig.colorbar(image, ax=ax, shrink=0.8)
+
+    if max(n_rows, n_cols) <= TICK_LABEL_MAX:
+        fontsize = 10 if max(n_rows, n_cols) <= ANNOTATE_MAX else 6
+        ax.set_xticks(np.arange(n_cols), labels=col_names, rotation=45, ha='right', fontsize=fontsize)
+        ax.set_yticks(np.arange(n_rows), labels=row_names, fontsize=fontsize)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+    if max(n_rows, n_cols) <= ANNOTATE_MAX:
+        for i in range(n_rows):
+            for j in range(n_cols):
+                value = block[i, j]
+                ax.text(j, i, f'{value:.2f}', ha='center', va='center', fontsize=8,
+                        color='white' if abs(value) > 0.6 else 'black')
+
+    # cluster boundaries as lines instead of per-cell borders
+    if labels is not None:
+        edges = np.flatnonzero(np.diff(labels)) + 0.5
+        for edge in edges:
+            ax.axhline(edge, color='black', linewidth=1)
+            ax.axvline(edge, color='black', linewidth=1)
+
+    ax.set_title(title, fontsize=16, pad=20)
+    fig.tight_layout()
+    return fig
+
+
+# clustered correlation heatmap, returns the saved path
+def save_heatmap(correlation_matrix, path="data/correlation_heatmap.png", labels=None, dpi=DPI,
+                 title='Cryptocurrency Price Correlation Heatmap'):
+    ordered, ordered_labels = reorder(correlation_matrix, labels)
+    names = [str(ticker) for ticker in ordered.index]
+
+    fig = _draw_block(ordered.to_numpy(dtype=np.float32), names, names, title,
+                      None if ordered_labels is None else ordered_labels.to_numpy())
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fig.savefig(path, dpi=dpi, bbox_inches='tight', facecolor='white')
+    return path
+
+
+# overview plus one zoomed tile per (row block, column block) of the reordered matrix
+# tiles below the diagonal are skipped since the matrix is symmetric; returns the saved paths
+def save_heatmap_tiles(correlation_matrix, output_dir="data/correlation_tiles", labels=None,
+                       tile_size=TILE_SIZE, dpi=DPI, fmt="png"):
+    os.makedirs(output_dir, exist_ok=True)
+
+    ordered, ordered_labels = reorder(correlation_matrix, labels)
+    matrix = ordered.to_numpy(dtype=np.float32)
+    names = [str(ticker) for ticker in ordered.index]
+    label_values = None if ordered_labels is None else ordered_labels.to_numpy()
+
+    overview = os.path.join(output_dir, f"overview.{fmt}")
+    _draw_block(matrix, names, names, 'Correlation Overview', label_values).savefig(
+        overview, dpi=dpi, bbox_inches='tight', facecolor='white')
+    paths = [overview]
+
+    starts = range(0, len(matrix), tile_size)
+    for row_tile, row in enumerate(starts):
+        for col_tile, col in enumerate(starts):
+            if col_tile < row_tile:
+                continue
+
+            rows = slice(row, row + tile_size)
+            cols = slice(col, col + tile_size)
+            title = f'Correlation Tile {row_tile},{col_tile} ({names[row]}..{names[min(row + tile_size, len(names)) - 1]})'
+            fig = _draw_block(matrix[rows, cols], names[rows], names[cols], title)
+
+            path = os.path.join(output_dir, f"tile_{row_tile}_{col_tile}.{fmt}")
+            fig.savefig(path, dpi=dpi, bbox_inches='tight', facecolor='white')
+            paths.append(path)
+
+    return paths
@@ -0,0 +1,70 @@
+import numpy as np
+
+from returns_matrix import as_returns_matrix
+
+
+# precomputed correlation structure of the returns matrix for per-asset hedge queries
+class HedgeIndex:
+    def __init__(self, df):
+        df = as_returns_matrix(df)
+
+        self.tickers = np.array(df.tickers)
+        self.rows = df.rows
+
+        # z-score every asset's returns so one matrix product gives the correlation matrix
+        matrix = np.asarray(df.to_numpy(), dtype=np.float64)
+        centered = matrix - matrix.mean(axis=1, keepdims=True)
+        std = centered.std(axis=1, keepdims=True)
+        z = np.divide(centered, std, out=np.zeros_like(centered), where=std > 0)
+
+        self.corr = (z @ z.T / matrix.shape[1]).astype(np.float32)
+        np.clip(self.corr, -1.0, 1.0, out=self.corr)
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def correlation(self, a, b):
+        return float(self.corr[self.rows[a], self.rows[b]])
+
+    # indexes of the k smallest scores, ordered, skipping the queried asset itself
+    def _top_k(self, row, scores, k, candidates=None):
+        scores = scores.astype(np.float64)
+        scores[row] = np.inf
+
+        if candidates is not None:
+            allowed = np.full(len(scores), False)
+            allowed[[self.rows[t] for t in candidates if t in self.rows]] = True
+            scores[~allowed] = np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+
+        best = np.argpartition(scores, k - 1)[:k]
+        best = best[np.argsort(scores[best], kind="stable")]
+
+        return [(str(self.tickers[i]), float(self.corr[row, i])) for i in best]
+
+    # k assets whose correlation with ticker is closest to zero
+    def least_correlated(self, ticker, k=5, candidates=None):
+        row = self.rows[ticker]
+        return self._top_k(row, np.abs(self.corr[row]), k, candidates)
+
+    # k assets with the most negative correlation to ticker
+    def most_negatively_correlated(self, ticker, k=5, candidates=None):
+        row = self.rows[ticker]
+        return self._top_k(row, self.corr[row], k, candidates)
+
+    # k assets that move most like ticker (correlation distance sqrt(2 * (1 - corr)))
+    def nearest_neighbors(self, ticker, k=5, candidates=None):
+        row = self.rows[ticker]
+        return self._top_k(row, np.sqrt(2.0 * (1.0 - self.corr[row])), k, candidates)
+
+    # candidates ordered from best to worst hedge for ticker (lowest correlation first)
+    def rank_hedges(self, ticker, candidates, k=None):
+        if ticker not in self.rows:
+            return list(candidates)[:k] if k is not None else list(candidates)
+
+        ranked = self.most_negatively_correlated(ticker, len(self.tickers), candidates)
+        ranked = [t for t, _ in ranked]
+        return ranked[:k] if k is not None else ranked
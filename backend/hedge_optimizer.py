@@ -0,0 +1,193 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from batch_analysis import analyze_portfolios, holdings_matrix, portfolio_values, price_vector
+from cluster_index import as_cluster_index
+from risk_engine import TRADING_DAYS, RiskEngine
+
+# most of the portfolio that may be rotated into hedges (sold pro-rata, bought into the target cluster)
+MAX_TURNOVER = 0.25
+MAX_ITER = 500
+TOLERANCE = 1e-12
+# hedge weights below this are reported as zero
+MIN_WEIGHT = 1e-4
+
+
+# Euclidean projection of each row onto {x >= 0, sum(x) <= budget}
+def project_capped_simplex(x, budget):
+    clipped = np.maximum(x, 0.0)
+    over = clipped.sum(axis=1) > budget
+    if not over.any():
+        return clipped
+
+    # rows over budget go onto the simplex sum(x) = budget (sort-based projection)
+    rows = x[over]
+    ordered = -np.sort(-rows, axis=1)
+    cumulative = np.cumsum(ordered, axis=1) - budget
+    ranks = np.arange(1, rows.shape[1] + 1)
+    active = ordered - cumulative / ranks > 0
+    count = active.sum(axis=1)
+    theta = cumulative[np.arange(len(rows)), count - 1] / count
+
+    clipped[over] = np.maximum(rows - theta[:, np.newaxis], 0.0)
+    return clipped
+
+
+# minimum-variance hedge sizing over the shared covariance of a RiskEngine
+class HedgeOptimizer:
+    def __init__(self, risk_engine):
+        if not isinstance(risk_engine, RiskEngine):
+            risk_engine = RiskEngine(risk_engine)
+
+        self.engine = risk_engine
+        self.tickers = risk_engine.tickers
+        self.cov = risk_engine.cov
+        self._blocks = {}
+
+    # covariance block of a hedge set and its largest eigenvalue, computed once per set
+    def _block(self, hedge_tickers):
+        key = tuple(hedge_tickers)
+        block = self._blocks.get(key)
+        if block is None:
+            idx = self.engine._index(hedge_tickers)
+            cov = self.cov[np.ix_(idx, idx)]
+            block = (idx, cov, float(np.linalg.eigvalsh(cov)[-1]))
+            self._blocks[key] = block
+        return block
+
+    # weights is a (portfolios x universe) matrix of current value weights (rows sum to 1)
+    # finds x >= 0 over hedge_tickers with sum(x) <= max_turnover minimizing the variance of
+    # (1 - sum(x)) * w + x, i.e. sell sum(x) pro-rata and buy x; all portfolios are solved together
+    # returns (hedge weights (portfolios x hedges), variance before, variance after)
+    def optimize(self, weights, hedge_tickers, max_turnover=MAX_TURNOVER, max_iter=MAX_ITER):
+        idx, cov_hh, top_eigenvalue = self._block(hedge_tickers)
+
+        weights_cov = np.asarray(weights @ self.cov)
+        variance = np.asarray((weights_cov * (weights.toarray() if hasattr(weights, "toarray") else weights)).sum(axis=1)).ravel()
+        cross = weights_cov[:, idx]
+        linear = cross - variance[:, np.newaxis]
+        m = len(idx)
+
+        # Q x = cov_hh x - a (1'x) - 1 (a'x) + s 1 (1'x), the rank-2 correction is per portfolio
+        def q_times(x):
+            total = x.sum(axis=1, keepdims=True)
+            return (x @ cov_hh - cross * total - (cross * x).sum(axis=1, keepdims=True)
+                    + variance[:, np.newaxis] * total)
+
+        # per-portfolio Lipschitz bound of the gradient
+        lipschitz = 2.0 * (top_eigenvalue + 2.0 * np.sqrt(m) * np.linalg.norm(cross, axis=1) + m * np.abs(variance))
+        step = (1.0 / np.maximum(lipschitz, 1e-18))[:, np.newaxis]
+
+        # accelerated projected gradient (FISTA), vectorized over portfolios
+        x = np.zeros((len(variance), m))
+        y = x.copy()
+        t = 1.0
+        for _ in range(max_iter):
+            gradient = 2.0 * (linear + q_times(y))
+            x_next = project_capped_simplex(y - step * gradient, max_turnover)
+
+            t_next = (1.0 + np.sqrt(1.0 + 4.0 * t * t)) / 2.0
+            y = x_next + ((t - 1.0) / t_next) * (x_next - x)
+            moved = np.abs(x_next - x).max() if x.size else 0.0
+            x, t = x_next, t_next
+            if moved < TOLERANCE:
+                break
+
+        x[x < MIN_WEIGHT] = 0.0
+        hedged = variance + 2.0 * (linear * x).sum(axis=1) + (x * q_times(x)).sum(axis=1)
+        return x, variance, np.maximum(hedged, 0.0)
+
+    # sizes hedges for many {ticker: quantity} portfolios into each one's recommended cluster
+    # portfolios with the same target cluster share one covariance block and are solved in one batch
+    def size_hedges(self, portfolios, current_prices, clustered_coins, max_turnover=MAX_TURNOVER):
+        index = as_cluster_index(clustered_coins)
+        tickers = self.tickers
+
+        holdings = holdings_matrix(portfolios, tickers)
+        prices = price_vector(current_prices, tickers)
+        summary = analyze_portfolios(holdings, prices, index, tickers)["summary"]
+        _, weights, totals = portfolio_values(holdings, prices)
+
+        fractions = np.zeros(len(portfolios))
+        vol_before = np.zeros(len(portfolios))
+        vol_after = np.zeros(len(portfolios))
+        hedges = [{} for _ in portfolios]
+
+        targets = summary["Target Cluster"].to_numpy()
+        for target in np.unique(targets):
+            rows = np.flatnonzero((targets == target) & (totals > 0))
+            if not len(rows):
+                continue
+
+            members = [t for t in index.cluster_members.get(int(target), ()) if t in self.engine]
+            block = weights[rows]
+            if target == -1 or not members:
+                variance = np.asarray((np.asarray(block @ self.cov) * block.toarray()).sum(axis=1)).ravel()
+                vol_before[rows] = vol_after[rows] = np.sqrt(np.maximum(variance, 0.0))
+                continue
+
+            x, before, after = self.optimize(block, members, max_turnover)
+            vol_before[rows] = np.sqrt(before)
+            vol_after[rows] = np.sqrt(after)
+            fractions[rows] = x.sum(axis=1)
+
+            for row, sizes in zip(rows, x):
+                nonzero = np.flatnonzero(sizes)
+                hedges[row] = {members[i]: float(sizes[i]) for i in nonzero[np.argsort(-sizes[nonzero])]}
+
+        result = summary[["Total Value", "Diagnosis", "Target Cluster"]].copy()
+        result["Hedge %"] = fractions * 100
+        result["Vol Before"] = vol_before * np.sqrt(TRADING_DAYS)
+        result["Vol After"] = vol_after * np.sqrt(TRADING_DAYS)
+        result["Hedges"] = hedges
+        return result
+
+    # hedge plan for one portfolio, None if none of its holdings are in the returns matrix
+    def hedge_plan(self, portfolio_dict, current_prices, clustered_coins, max_turnover=MAX_TURNOVER):
+        row = self.size_hedges([portfolio_dict], current_prices, clustered_coins, max_turnover).iloc[0]
+        if row["Total Value"] <= 0:
+            return None
+
+        return {
+            "target_cluster": int(row["Target Cluster"]),
+            "hedge_fraction": float(row["Hedge %"]) / 100,
+            "annual_volatility_before": float(row["Vol Before"]),
+            "annual_volatility_after": float(row["Vol After"]),
+            "hedges": row["Hedges"],
+        }
+
+
+# recomputes hedge sizes for a whole book, {"name": {"BTC": 0.5, ...}, ...}
+def main():
+    from main import CACHE_DIR
+    from market_cache import load_generation
+    from price_fetcher import get_curr_prices
+
+    parser = argparse.ArgumentParser(description="Minimum-variance hedge sizes for a book of portfolios.")
+    parser.add_argument("book", help='JSON file like {"alice": {"BTC": 0.5}, "bob": {"ETH": 2}}')
+    parser.add_argument("--max-turnover", type=float, default=MAX_TURNOVER)
+    args = parser.parse_args()
+
+    df, clusters = load_generation(CACHE_DIR)
+    if df is None or clusters is None:
+        print("No trained model cached. Run main.py first to fetch market data.")
+        return
+
+    with open(args.book) as f:
+        book = json.load(f)
+
+    names = list(book)
+    portfolios = [{str(t).upper(): float(q) for t, q in book[name].items()} for name in names]
+    prices = get_curr_prices(sorted({t for p in portfolios for t in p}))
+
+    result = HedgeOptimizer(df).size_hedges(portfolios, prices, clusters, args.max_turnover)
+    result.index = pd.Index(names, name="Portfolio")
+    result["Hedges"] = [", ".join(f"{t} {w:.1%}" for t, w in h.items()) for h in result["Hedges"]]
+
+    print(result.to_string(float_format=lambda v: f"{v:,.2f}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+
+# initial centroids for today's matrix taken from yesterday's cluster memberships
+def seed_centroids(matrix, tickers, previous_clusters, n_clusters):
+    previous = previous_clusters.reindex(tickers).to_numpy()
+
+    centroids = np.zeros((n_clusters, matrix.shape[1]), dtype=np.float64)
+    filled = []
+    empty = []
+
+    for k in range(n_clusters):
+        members = previous == k
+        if members.any():
+            centroids[k] = matrix[members].mean(axis=0)
+            filled.append(k)
+        else:
+            empty.append(k)
+
+    # clusters with no surviving members are seeded with the point farthest from the other seeds
+    for k in empty:
+        if filled:
+            distances = ((matrix[:, None, :] - centroids[filled][None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            centroids[k] = matrix[int(np.argmax(distances))]
+        else:
+            centroids[k] = matrix[k % len(matrix)]
+        filled.append(k)
+
+    return centroids
+
+
+# new label -> old label assignment that minimizes the total centroid distance
+def match_labels(old_centroids, new_centroids):
+    cost = ((new_centroids[:, None, :] - old_centroids[None, :, :]) ** 2).sum(axis=2)
+    new_ids, old_ids = linear_sum_assignment(cost)
+
+    mapping = np.empty(len(new_centroids), dtype=int)
+    mapping[new_ids] = old_ids
+    return mapping
+
+
+# single-init KMeans seeded from the previous clustering, with labels aligned to the previous ids
+# with batch_size set the seeded fit runs as MiniBatchKMeans, for universes too large for full KMeans
+def warm_start_kmeans(df, previous_clusters, n_clusters, random_state=None, batch_size=None):
+    matrix = df.to_numpy()
+
+    seeds = seed_centroids(matrix, df.index, previous_clusters, n_clusters)
+
+    if batch_size is not None:
+        model = MiniBatchKMeans(n_clusters=n_clusters, init=seeds.astype(matrix.dtype), n_init=1,
+                                batch_size=batch_size, random_state=random_state)
+    else:
+        model = KMeans(n_clusters=n_clusters, init=seeds.astype(matrix.dtype), n_init=1, random_state=random_state)
+    model.fit(matrix)
+
+    return model, align_labels(model, df, previous_clusters, n_clusters, seeds)
+
+
+# relabels a model fitted on df in place so its ids line up with previous_clusters, returns the new labels
+# also used for snapshot hits, whose fit may have been cold or seeded from other clusters
+def align_labels(model, df, previous_clusters, n_clusters, seeds=None):
+    if seeds is None:
+        seeds = seed_centroids(df.to_numpy(), df.index, previous_clusters, n_clusters)
+
+    mapping = match_labels(seeds, model.cluster_centers_)
+
+    # relabel in place so the stored model agrees with the stable ids
+    centers = np.empty_like(model.cluster_centers_)
+    centers[mapping] = model.cluster_centers_
+    model.cluster_centers_ = centers
+    model.labels_ = mapping[model.labels_]
+
+    return pd.Series(model.labels_, index=df.index)
+
+
+# previous labels can seed a warm start only if they overlap today's tickers and fit the current k
+def can_warm_start(df, previous_clusters, n_clusters):
+    if previous_clusters is None:
+        return False
+
+    overlap = previous_clusters.reindex(df.index).dropna()
+    if overlap.empty:
+        return False
+
+    return overlap.between(0, n_clusters - 1).all()
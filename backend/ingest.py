@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# bucket widths in epoch milliseconds, epoch time is UTC so day buckets close at 00:00 UTC
+GRANULARITY_MS = {
+    "daily": 86_400_000,
+    "hourly": 3_600_000,
+}
+
+
+# raw market_chart [[ms, price], ...] -> (int64 ms array, float64 price array), without per-point Python work
+def to_epoch_arrays(points):
+    data = np.asarray(points, dtype=np.float64)
+    if data.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+# last price in each bucket -> (bucket start ms, close)
+def resample_closes(ms, prices, granularity="daily"):
+    width = GRANULARITY_MS[granularity]
+
+    if len(ms) == 0:
+        return ms, prices
+
+    if np.any(np.diff(ms) < 0):
+        order = np.argsort(ms, kind="stable")
+        ms, prices = ms[order], prices[order]
+
+    buckets = ms // width
+
+    # the last point of every run of equal buckets is that bucket's close
+    last = np.flatnonzero(np.diff(buckets, append=buckets[-1] + 1))
+    return buckets[last] * width, prices[last]
+
+
+# {ticker: [[ms, price], ...]} -> closes (buckets x tickers) built from one scatter into a dense matrix
+def payloads_to_frame(prices, granularity="daily"):
+    tickers = []
+    bucket_parts = []
+    close_parts = []
+    column_parts = []
+
+    for ticker, points in prices.items():
+        ms, values = to_epoch_arrays(points)
+        buckets, closes = resample_closes(ms, values, granularity)
+        if len(buckets) == 0:
+            continue
+
+        column_parts.append(np.full(len(buckets), len(tickers)))
+        tickers.append(ticker)
+        bucket_parts.append(buckets)
+        close_parts.append(closes)
+
+    if not tickers:
+        return pd.DataFrame()
+
+    buckets = np.concatenate(bucket_parts)
+    index, rows = np.unique(buckets, return_inverse=True)
+
+    matrix = np.full((len(index), len(tickers)), np.nan)
+    matrix[rows, np.concatenate(column_parts)] = np.concatenate(close_parts)
+
+    frame = pd.DataFrame(matrix, index=pd.to_datetime(index, unit="ms"), columns=tickers)
+    frame.index.name = "date"
+    return frame
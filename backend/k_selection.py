@@ -0,0 +1,129 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from metrics import timed
+from model_store import MODEL_DIR, load_k_scores, model_key, save_k_scores
+from returns_matrix import as_returns_matrix
+
+# the recommendation themes (Safe Haven, Blue Chips, High Volatility, Altcoins) need at least four clusters
+K_MIN = 4
+K_MAX = 9
+N_INIT = 10
+N_REFS = 5
+RANDOM_STATE = 42
+# silhouette is O(n^2), larger universes are scored on a sample
+SILHOUETTE_SAMPLE = 2000
+DEFAULT_METHOD = "silhouette"
+# workers are started fresh rather than forked, since the caller may have other threads
+# (the background market refresh, the service) holding locks or OpenMP state at fork time
+MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+# inertia, silhouette and gap statistic for one k (runs in a worker process)
+# sklearn is imported here so looking up a cached choice does not pay for it
+def _score_k(args):
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+    from threadpoolctl import threadpool_limits
+
+    matrix, k, n_refs, random_state = args
+
+    with threadpool_limits(1):
+        model = KMeans(n_clusters=k, n_init=N_INIT, random_state=random_state)
+        labels = model.fit_predict(matrix)
+        inertia = float(model.inertia_)
+
+        silhouette = np.nan
+        if 2 <= k < len(matrix) and len(np.unique(labels)) > 1:
+            sample = min(SILHOUETTE_SAMPLE, len(matrix))
+            silhouette = float(silhouette_score(matrix, labels, sample_size=sample, random_state=random_state))
+
+        # gap statistic against uniform reference data drawn from the matrix's bounding box
+        rng = np.random.default_rng(random_state + k)
+        low, high = matrix.min(axis=0), matrix.max(axis=0)
+        ref_logs = []
+        for _ in range(n_refs):
+            reference = rng.uniform(low, high, size=matrix.shape)
+            ref_model = KMeans(n_clusters=k, n_init=1, random_state=random_state).fit(reference)
+            ref_logs.append(np.log(max(ref_model.inertia_, 1e-12)))
+
+    ref_logs = np.array(ref_logs)
+    gap = float(ref_logs.mean() - np.log(max(inertia, 1e-12)))
+    gap_std = float(ref_logs.std() * np.sqrt(1 + 1 / n_refs))
+
+    return {"k": k, "inertia": inertia, "silhouette": silhouette, "gap": gap, "gap_std": gap_std}
+
+
+# picks k from the scores, "gap" uses the Tibshirani one-standard-error rule
+def choose_k(scores, method=DEFAULT_METHOD):
+    if method == "silhouette":
+        valid = [s for s in scores if not np.isnan(s["silhouette"])]
+        if valid:
+            return max(valid, key=lambda s: s["silhouette"])["k"]
+        method = "gap"
+
+    if method == "gap":
+        for current, following in zip(scores, scores[1:]):
+            if current["gap"] >= following["gap"] - following["gap_std"]:
+                return current["k"]
+        return max(scores, key=lambda s: s["gap"])["k"]
+
+    raise ValueError(f"Unknown k selection method: {method}")
+
+
+# scores every k in [k_min, k_max] in parallel; cached per data hash, returns (chosen k, scores)
+@timed()
+def select_k(df, k_min=K_MIN, k_max=K_MAX, method=DEFAULT_METHOD, n_refs=N_REFS,
+             random_state=RANDOM_STATE, max_workers=None, use_cache=True, model_dir=MODEL_DIR):
+    df = as_returns_matrix(df)
+
+    k_max = min(k_max, len(df) - 1)
+    params = {"k_min": k_min, "k_max": k_max, "n_refs": n_refs, "random_state": random_state, "n_init": N_INIT}
+    key = model_key(df, params)
+
+    scores = load_k_scores(key, model_dir) if use_cache else None
+
+    if scores is None:
+        matrix = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+        jobs = [(matrix, k, n_refs, random_state) for k in range(k_min, k_max + 1)]
+
+        with ProcessPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count()),
+                                 mp_context=multiprocessing.get_context(MP_CONTEXT)) as pool:
+            scores = list(pool.map(_score_k, jobs))
+
+        if use_cache:
+            save_k_scores(key, scores, model_dir)
+
+    return choose_k(scores, method), scores
+
+
+def main():
+    from market_cache import load_generation
+    from main import CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Pick the number of KMeans clusters for the cached market data.")
+    parser.add_argument("--min-k", type=int, default=K_MIN)
+    parser.add_argument("--max-k", type=int, default=K_MAX)
+    parser.add_argument("--method", choices=["gap", "silhouette"], default=DEFAULT_METHOD)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    df, _ = load_generation(CACHE_DIR)
+    if df is None:
+        print("No market data cached. Run main.py first to fetch market data.")
+        return
+
+    k, scores = select_k(df, args.min_k, args.max_k, args.method, use_cache=not args.no_cache)
+
+    print(f"{'K':<4} | {'INERTIA':<12} | {'SILHOUETTE':<10} | {'GAP':<8} | {'GAP SD'}")
+    print(f"{'-'*52}")
+    for s in scores:
+        print(f"{s['k']:<4} | {s['inertia']:<12.4f} | {s['silhouette']:<10.3f} | {s['gap']:<8.3f} | {s['gap_std']:.3f}")
+    print(f"\nChosen k ({args.method}): {k}")
+
+if __name__ == "__main__":
+    main()
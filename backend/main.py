@@ -1,106 +1,225 @@
+import sys
+import threading
 import time
-import os
 
 import pandas as pd
 
-from sklearn.cluster import KMeans
 from price_fetcher import generate_df
 from price_fetcher import get_curr_prices
-from portfolio_visualizer import save_portfolio_scatterplot
+from model_store import load_model, model_key, save_model
+from cluster_index import BLUE_CHIPS, HEDGE_CANDIDATES, HIGH_VOLATILITY, SAFE_HAVEN, THEME_KEYS, THEMES, ClusterIndex, as_cluster_index, classify_members
+from batch_analysis import analyze_portfolios, holdings_matrix, price_vector
+from hedge_index import HedgeIndex
+from returns_matrix import as_returns_matrix
+from metrics import increment, timed
+from market_cache import acquire_refresh_lock, cache_age, load_generation, publish_generation, release_refresh_lock
+
+# sklearn, scipy.optimize and matplotlib are imported inside the functions that need them
+# so that answering from the cached model (fulcrum.py, service.py) starts fast
 
 CLUSTERS = 4
+# pick the number of clusters from the data (see k_selection.py), CLUSTERS otherwise
+AUTO_K = True
+RANDOM_STATE = 42
+N_INIT = 10
+# universes at least this large are clustered with MiniBatchKMeans to bound time and memory
+MINIBATCH_THRESHOLD = 1000
+MINIBATCH_SIZE = 1024
+MINIBATCH_N_INIT = 3
 ANCHOR_SAFE_ASSET = "USDC"
-CACHE_FILE = "data/market_prices.csv"
+CACHE_DIR = "data/market_cache"
 CACHE_DURATION_SECONDS = 86400
-
-# only generates new data every 24 hrs (increased speed and less API calls)
-def get_market_data():
-    # check if cache file exists
-    if os.path.exists(CACHE_FILE):
-        # Get the file's last modified timestamp
-        last_modified = os.path.getmtime(CACHE_FILE)
-        current_time = time.time()
-        
+# pause between dashboard sections in the interactive menu
+DRAMATIC_PAUSE_SECONDS = 2.5
+# serve expired data right away and refresh it in the background
+STALE_WHILE_REVALIDATE = True
+
+# only refreshes data every 24 hrs, and then only fetches the days missing since the last refresh
+# returns (df, clustered_coins), clusters are None if the cache has none
+@timed()
+def get_market_data(stale_while_revalidate=STALE_WHILE_REVALIDATE):
+    age = cache_age(CACHE_DIR)
+
+    # check if cache exists
+    if age is not None:
         # check if it is less than 24 hours old
-        if current_time - last_modified < CACHE_DURATION_SECONDS:
-            print("Loading data from local cache (fast)...")
-            # load from CSV and ensure Ticker is the index
-            df = pd.read_csv(CACHE_FILE, index_col=0)
-            return df
-        
-        else:
-            print("Cache is expired (>24h). Fetching fresh data...")
+        if age < CACHE_DURATION_SECONDS:
+            print("Loading data from local cache (fast)...", file=sys.stderr)
+            increment("market_cache_hits")
+            return load_generation(CACHE_DIR)
 
-    else:
-        print("No cache found. Fetching fresh data...")
+        if stale_while_revalidate:
+            print("Cache is expired (>24h). Using it while fresh data loads in the background...", file=sys.stderr)
+            increment("market_cache_stale")
+            threading.Thread(target=refresh_market_data, name="market-refresh").start()
+            return load_generation(CACHE_DIR)
 
-    # fetch fresh data
-    df_fresh = generate_df()
-    df_fresh.to_csv(CACHE_FILE)
-    
-    return df_fresh
+        print("Cache is expired (>24h). Fetching new data since last refresh...", file=sys.stderr)
+
+    else:
+        print("No cache found. Fetching fresh data...", file=sys.stderr)
+
+    # fetch fresh data, or wait for whoever is already fetching it
+    increment("market_cache_misses")
+    refresh_market_data(wait=True)
+    return load_generation(CACHE_DIR)
+
+# rebuilds the dataset and clusters and swaps them into the cache together
+# only one process refreshes at a time, others skip (or wait, if they have nothing to serve)
+def refresh_market_data(wait=False):
+    published_before = cache_age(CACHE_DIR)
+
+    token = acquire_refresh_lock(CACHE_DIR)
+    while token is None:
+        if not wait:
+            return False
+        time.sleep(1)
+        token = acquire_refresh_lock(CACHE_DIR)
+
+    try:
+        # another process may have published while we waited on the lock
+        age = cache_age(CACHE_DIR)
+        if wait and age is not None and (published_before is None or age < published_before):
+            return True
+
+        # yesterday's clusters seed today's training so cluster ids stay stable
+        _, previous_clusters = load_generation(CACHE_DIR)
+
+        df_fresh = as_returns_matrix(generate_df())
+        clusters = train_model(df_fresh, previous_clusters=previous_clusters)
+        publish_generation(df_fresh, clusters, CACHE_DIR)
+        return True
+
+    except Exception as e:
+        # a caller waiting on the refresh has nothing else to serve, so it gets the error
+        if wait:
+            raise
+        print(f"Background refresh failed : {e}", file=sys.stderr)
+        return False
+
+    finally:
+        release_refresh_lock(token, CACHE_DIR)
 
 # train KMeans model
-def train_model(df):
-    if 'Ticker' in df.columns:
-        df = df.set_index('Ticker')
+@timed()
+def train_model(df, previous_clusters=None):
+    model, clustered_coins = fit_model(df, previous_clusters=previous_clusters)
+    return clustered_coins
 
-    model = KMeans(n_clusters=CLUSTERS, random_state=42, n_init=10)
-    model.fit(df)
+# returns (model, clustered_coins), reusing the snapshot stored for this exact data + config
+# with previous_clusters, training is warm-started from them and keeps their cluster ids
+def fit_model(df, use_snapshot=True, previous_clusters=None):
+    df = as_returns_matrix(df)
 
-    clustered_coins = pd.Series(model.labels_, index=df.index)
-    
-    return clustered_coins
+    n_clusters = get_cluster_count(df)
+    minibatch = len(df) >= MINIBATCH_THRESHOLD
+
+    warm_start = False
+    if previous_clusters is not None:
+        from incremental_clustering import can_warm_start
+        warm_start = bool(can_warm_start(df, previous_clusters, n_clusters))
+
+    # the key records the path actually taken: a warm start is a single seeded init
+    params = {"n_clusters": n_clusters, "random_state": RANDOM_STATE, "n_init": MINIBATCH_N_INIT if minibatch else N_INIT}
+    fitted = {**params, "n_init": 1} if warm_start else params
+    key = model_key(df, {**fitted, "minibatch": minibatch, "warm_start": warm_start})
+
+    if use_snapshot:
+        snapshot = load_model(key)
+        if snapshot is not None:
+            increment("model_snapshot_hits")
+            model, clustered_coins = snapshot
+
+            # the key does not cover the seeds, so a snapshot whose ids drifted from previous_clusters is realigned
+            if warm_start and not same_ids(clustered_coins, previous_clusters):
+                from incremental_clustering import align_labels
+                clustered_coins = align_labels(model, df, previous_clusters, n_clusters)
+
+            return model, clustered_coins
+
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if warm_start:
+        from incremental_clustering import warm_start_kmeans
+        batch_size = MINIBATCH_SIZE if minibatch else None
+        model, clustered_coins = warm_start_kmeans(df, previous_clusters, n_clusters, RANDOM_STATE, batch_size)
+    else:
+        if minibatch:
+            model = MiniBatchKMeans(batch_size=MINIBATCH_SIZE, **params)
+        else:
+            model = KMeans(**params)
+        model.fit(df.to_numpy())
+
+        clustered_coins = pd.Series(model.labels_, index=df.index)
+
+    increment("kmeans_fits")
+    increment("kmeans_iterations", int(getattr(model, "n_iter_", 0)))
+
+    if use_snapshot:
+        save_model(key, model, clustered_coins)
+
+    return model, clustered_coins
+
+# True when every ticker clustered before keeps its previous cluster id
+def same_ids(clustered_coins, previous_clusters):
+    previous = previous_clusters.reindex(clustered_coins.index)
+    known = previous.notna()
+    return bool((clustered_coins[known].to_numpy() == previous[known].to_numpy()).all())
+
+# number of clusters to train with, chosen per data hash when AUTO_K is on
+# select_k looks its cached scores up first, so snapshot hits only pay for a hash and a small file read
+def get_cluster_count(df):
+    if not AUTO_K:
+        return CLUSTERS
+
+    try:
+        from k_selection import select_k
+        k, _ = select_k(df)
+        return k
+    except Exception as e:
+        print(f"Could not select k automatically, using {CLUSTERS} : {e}", file=sys.stderr)
+        return CLUSTERS
 
 # classifies what cluster specific coins are in --> used for recommendations
 def classify_clusters(cluster_id, clustered_coins):
-    coins_in_cluster = clustered_coins[clustered_coins == cluster_id].index.tolist()
-    
-    # Stables
-    if "USDC" in coins_in_cluster or "USDT" in coins_in_cluster:
-        return "Safe Haven (Stablecoins)"
-    
-    # Major Alts
-    if "ETH" in coins_in_cluster or "SOL" in coins_in_cluster:
-        return "Blue Chips (L1s & Majors)"
-        
-    # Memes & speculative
-    if "PEPE" in coins_in_cluster or "DOGE" in coins_in_cluster:
-        return "High Volatility (Memes & Speculative)"
-        
-    # Broad Altcoin market
-    return "Altcoins (Mid-Cap)"
+    if isinstance(clustered_coins, ClusterIndex):
+        return clustered_coins.cluster_theme[int(cluster_id)]
+
+    coins_in_cluster = set(clustered_coins[clustered_coins == cluster_id].index)
+    return THEMES[classify_members(coins_in_cluster)]
+
+# example assets from a theme's cluster, ranked by correlation to coin when a hedge index is given
+def hedge_options(coin, theme_key, index, hedge_index=None):
+    if hedge_index is None:
+        return index.hedge_candidates[theme_key]
+
+    members = index.cluster_members.get(index.theme_cluster[theme_key], ())
+    return hedge_index.rank_hedges(coin, members, HEDGE_CANDIDATES)
 
 # generates hedge recommendations for single asset based on classifications
-def get_hedge_rec(coin, clustered_coins):
-    if coin not in clustered_coins:
+def get_hedge_rec(coin, clustered_coins, hedge_index=None):
+    index = as_cluster_index(clustered_coins)
+
+    if coin not in index:
         return "Coin not found in database."
 
     # 1. Identify the User's Context
-    user_cluster_id = clustered_coins[coin]
-    user_theme = classify_clusters(user_cluster_id, clustered_coins)
+    user_cluster_id = index.cluster_of(coin)
+    user_theme = index.cluster_theme[user_cluster_id]
     
     print(f"\n--- ANALYSIS FOR {coin} ---")
     print(f"Asset Class: {user_theme} (Cluster #{user_cluster_id})")
 
     # 2. Find the "Target" Clusters for Hedging
-    safe_cluster_id = -1
-    blue_chip_cluster_id = -1
-    
-    unique_clusters = clustered_coins.unique()
-    for c_id in unique_clusters:
-        theme = classify_clusters(c_id, clustered_coins)
-        if "Safe Haven" in theme:
-            safe_cluster_id = c_id
-        elif "Blue Chips" in theme:
-            blue_chip_cluster_id = c_id
+    safe_cluster_id = index.theme_cluster[SAFE_HAVEN]
+    blue_chip_cluster_id = index.theme_cluster[BLUE_CHIPS]
 
     # 3. Generate Specific Advice
     if "Safe Haven" in user_theme:
         print("Insight: You are playing it safe. This protects capital but limits gains.")
         if blue_chip_cluster_id != -1:
             print(f"Recommendation: For growth, consider adding 'Blue Chip' assets (Cluster #{blue_chip_cluster_id}).")
-            print(f"Examples: {clustered_coins[clustered_coins == blue_chip_cluster_id].index.tolist()[:5]}")
+            print(f"Examples: {hedge_options(coin, BLUE_CHIPS, index, hedge_index)}")
             
     elif "High Volatility" in user_theme:
         print("Insight: This is a high-risk 'Degen' play. High upside, massive downside.")
@@ -108,33 +227,62 @@ def get_hedge_rec(coin, clustered_coins):
         # Suggestion 1: Safety
         if safe_cluster_id != -1:
              print(f"Recommendation A (Safety): Hedge massive swings with 'Safe Haven' assets.")
-             print(f"  -> Options: {clustered_coins[clustered_coins == safe_cluster_id].index.tolist()[:5]}")
+             print(f"  -> Options: {hedge_options(coin, SAFE_HAVEN, index, hedge_index)}")
         
         # Suggestion 2: Majors (The new addition)
         if blue_chip_cluster_id != -1:
              print(f"Recommendation B (Stability): Rotate profits into 'Blue Chips' for sustained growth.")
-             print(f"  -> Options: {clustered_coins[clustered_coins == blue_chip_cluster_id].index.tolist()[:5]}")
+             print(f"  -> Options: {hedge_options(coin, BLUE_CHIPS, index, hedge_index)}")
              
     elif "Blue Chips" in user_theme:
         print("Insight: You hold a Market Mover. It follows the general market trend.")
         print("Recommendation: To reduce volatility, hedge with Stablecoins.")
         if safe_cluster_id != -1:
-             print(f"Hedge with: {clustered_coins[clustered_coins == safe_cluster_id].index.tolist()[:5]}")
+             print(f"Hedge with: {hedge_options(coin, SAFE_HAVEN, index, hedge_index)}")
              
     else: # Mid-Cap Alts
         print("Insight: You hold a Mid-Cap Altcoin. These often bleed against ETH/BTC.")
         print("Recommendation: Consider rotating into market leaders (Blue Chips) or cash (Safe Haven).")
 
-def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df=None):
+# themes get_hedge_rec points each theme towards
+HEDGE_TARGETS = {
+    SAFE_HAVEN: [BLUE_CHIPS],
+    HIGH_VOLATILITY: [SAFE_HAVEN, BLUE_CHIPS],
+    BLUE_CHIPS: [SAFE_HAVEN],
+}
+MID_CAP_TARGETS = [BLUE_CHIPS, SAFE_HAVEN]
+
+# structured (non-printing) version of get_hedge_rec, None if the coin is unknown
+def hedge_summary(coin, clustered_coins, hedge_index=None):
+    index = as_cluster_index(clustered_coins)
+
+    if coin not in index:
+        return None
+
+    cluster_id = index.cluster_of(coin)
+    key = index.cluster_key[cluster_id]
+
+    hedges = {}
+    for target in HEDGE_TARGETS.get(key, MID_CAP_TARGETS):
+        target_id = index.theme_cluster[target]
+        if target_id != -1:
+            hedges[target] = {"cluster": target_id, "assets": hedge_options(coin, target, index, hedge_index)}
+
+    return {"ticker": coin, "cluster": cluster_id, "theme": index.cluster_theme[cluster_id], "hedges": hedges}
+
+@timed()
+def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df=None, pause=DRAMATIC_PAUSE_SECONDS, plot=True):
+    index = as_cluster_index(clustered_coins)
+
     cluster_exposure = {}
     total_value = 0.0
     holdings_data = []
 
     # calculate value per cluster
     for coin, quantity in portfolio_dict.items():
-        if coin in clustered_coins:
-            cluster_id = clustered_coins[coin]
-            theme = classify_clusters(cluster_id, clustered_coins)
+        if coin in index:
+            cluster_id = index.cluster_of(coin)
+            theme = index.cluster_theme[cluster_id]
 
             price = current_prices.get(coin, 0)
             value = price * quantity
@@ -149,7 +297,7 @@ def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df
                 "Role": theme
             })
 
-    time.sleep(2.5)
+    time.sleep(pause)
     print("Building dashboard...")
 
     if total_value == 0:
@@ -179,7 +327,7 @@ def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df
         "Altcoins": {"pct": 0, "id": -1}
     }
 
-    time.sleep(2.5)
+    time.sleep(pause)
     print("Loading analysis...")
 
     print(f"\n--- PORTFOLIO ANALYSIS (Total: ${total_value:,.2f}) ---")
@@ -187,34 +335,20 @@ def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df
     # calculate pct & identify ids
     for c_id, value in cluster_exposure.items():
         pct = (value / total_value) * 100
-        theme = classify_clusters(c_id, clustered_coins)
+        theme = index.cluster_theme[c_id]
         
         print(f"  {theme}: {pct:.1f}% (${value:,.2f})")
 
-        if "Safe Haven" in theme:
-            key = "Safe Haven"
-        elif "Blue Chips" in theme:
-            key = "Blue Chips"
-        elif "High Volatility" in theme:
-            key = "High Volatility"
-        else:
-            key = "Altcoins"
-            
+        key = index.cluster_key[c_id]
         stats[key]["pct"] += pct
         stats[key]["id"] = c_id
 
     print("\n")
 
     # fill in Missing ids
-    unique_clusters = clustered_coins.unique()
-    
     for key in stats:
         if stats[key]["id"] == -1:
-            for c in unique_clusters:
-                theme = classify_clusters(c, clustered_coins)
-                if key in theme: # e.g. "Blue Chips" in "Blue Chips (L1s)"
-                    stats[key]["id"] = c
-                    break
+            stats[key]["id"] = index.theme_cluster[key]
     
     # Extract vars for readability in logic tree
     safe_pct = stats["Safe Haven"]["pct"]
@@ -226,7 +360,7 @@ def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df
     alt_id = stats["Altcoins"]["id"]
     alt_pct = stats["Altcoins"]["pct"]
 
-    time.sleep(2.5)
+    time.sleep(pause)
     print("Generating advice...")
 
     print(f"--- AI PORTFOLIO RECOMMENDATIONS & ACTION PLAN ---")
@@ -277,32 +411,95 @@ def analyze_portfolio(portfolio_dict, current_prices, clustered_coins, market_df
         print("   Insight: Well-structured exposure to Growth, Safety, and Speculation.")
         print("   Action: Maintain current weights.")
 
-    # generate and save visualization
+    # covariance risk from the returns matrix
     if market_df is not None:
+        from hedge_optimizer import HedgeOptimizer
+        from risk_engine import RiskEngine
+
+        engine = RiskEngine(market_df)
+        risk = engine.report(portfolio_dict, current_prices)
+        if risk is not None:
+            print(f"\n--- RISK ({risk['confidence']:.0%}, {risk['horizon_days']}-day) ---")
+            print(f"  Volatility : {risk['daily_volatility']:.2%} daily | {risk['annual_volatility']:.1%} annualized")
+            for method in ("parametric", "historical"):
+                var, cvar = risk[method]["var"], risk[method]["cvar"]
+                print(f"  {method.title():<11}: VaR {var:.2%} (${var * total_value:,.2f}) | CVaR {cvar:.2%} (${cvar * total_value:,.2f})")
+
+            print(f"\n  {'ASSET':<10} | {'SHARE OF RISK'}")
+            for coin, share in sorted(risk["risk_contribution"].items(), key=lambda x: x[1], reverse=True):
+                print(f"  {coin:<10} | {share:.1%}")
+
+            # hedge size solved from the covariance instead of the fixed percentages above
+            plan = HedgeOptimizer(engine).hedge_plan(portfolio_dict, current_prices, index)
+            if plan is not None and plan["target_cluster"] != -1:
+                before, after = plan["annual_volatility_before"], plan["annual_volatility_after"]
+                if plan["hedges"]:
+                    assets = ", ".join(f"{coin} {weight:.1%}" for coin, weight in plan["hedges"].items())
+                    print(f"\n  Min-variance hedge: rotate {plan['hedge_fraction']:.1%} into Cluster #{plan['target_cluster']} ({assets})")
+                    print(f"  Annualized volatility: {before:.1%} -> {after:.1%}")
+                else:
+                    print(f"\n  Min-variance hedge: adding Cluster #{plan['target_cluster']} would not lower volatility ({before:.1%}).")
+
+    # generate and save visualization
+    if market_df is not None and plot:
         print("\n--- GENERATING VISUALIZATION ---")
         user_assets = list(portfolio_dict.keys())
         try:
-            filepath = save_portfolio_scatterplot(market_df, clustered_coins, user_assets)
+            from portfolio_visualizer import save_portfolio_scatterplot
+            filepath = save_portfolio_scatterplot(market_df, index.clustered_coins, user_assets)
             print(f"✓ Portfolio visualization saved to: {filepath}")
         except Exception as e:
             print(f"⚠ Could not generate visualization: {e}")
 
+# structured (non-printing, no delays) version of analyze_portfolio
+def portfolio_summary(portfolio_dict, current_prices, clustered_coins, risk_engine=None, hedge_optimizer=None):
+    index = as_cluster_index(clustered_coins)
+    tickers = list(index.ticker_cluster)
+
+    result = analyze_portfolios(holdings_matrix([portfolio_dict], tickers), price_vector(current_prices, tickers), index, tickers)
+    row = result["summary"].iloc[0]
+    total_value = float(row["Total Value"])
+
+    holdings = []
+    for coin, quantity in portfolio_dict.items():
+        if coin in index:
+            value = current_prices.get(coin, 0) * quantity
+            holdings.append({
+                "asset": coin,
+                "value": value,
+                "weight": value / total_value * 100 if total_value > 0 else 0.0,
+                "role": index.theme_of(coin),
+            })
+    holdings.sort(key=lambda x: x["value"], reverse=True)
+
+    return {
+        "total_value": total_value,
+        "holdings": holdings,
+        "exposure": {key: float(row[f"{key} %"]) for key in THEME_KEYS},
+        "diagnosis": row["Diagnosis"],
+        "target_cluster": int(row["Target Cluster"]),
+        "unknown": [coin for coin in portfolio_dict if coin not in index],
+        # tickers the price lookup could not find (they count as $0 above)
+        "unpriced": [coin for coin in portfolio_dict if coin not in current_prices],
+        "risk": risk_engine.report(portfolio_dict, current_prices) if risk_engine is not None else None,
+        "hedge": hedge_optimizer.hedge_plan(portfolio_dict, current_prices, index) if hedge_optimizer is not None else None,
+    }
+
 def main():
     # generates df
     print("Scraping market data...")
-    df = get_market_data()
+    df, cached_clusters = get_market_data()
+    df = as_returns_matrix(df)
 
-    if 'Ticker' in df.columns:
-        df = df.set_index('Ticker')
-
-    time.sleep(2.5)
+    time.sleep(DRAMATIC_PAUSE_SECONDS)
 
     print("Training model...")
-    time.sleep(2.5)
+    time.sleep(DRAMATIC_PAUSE_SECONDS)
     print("Generating clusters...")
-    clusters = train_model(df)
+    # loads the stored model when data and config are unchanged
+    clusters = ClusterIndex(train_model(df, previous_clusters=cached_clusters))
 
-    time.sleep(2.5)
+    time.sleep(DRAMATIC_PAUSE_SECONDS)
 
     # user interface
     while True:
@@ -314,7 +511,7 @@ def main():
         match query:
             case '1':
                 coin = input("Enter coin ticker: ").upper()
-                get_hedge_rec(coin, clusters)
+                get_hedge_rec(coin, clusters, HedgeIndex(df))
                 break
 
             case '2':
@@ -339,5 +536,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
-
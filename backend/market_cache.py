@@ -0,0 +1,145 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from returns_store import load_returns, save_returns
+
+CACHE_DIR = "data/market_cache"
+POINTER_FILE = "CURRENT"
+LOCK_FILE = "refresh.lock"
+RETURNS_FILE = "returns.npy"
+CLUSTERS_FILE = "clusters.json"
+KEEP_GENERATIONS = 2
+# prefix of the directory a generation is built in before it is renamed into place
+TMP_PREFIX = "tmp-"
+# a build directory older than this belongs to a publish that crashed (publishing takes seconds)
+TMP_MAX_AGE_SECONDS = 3600
+
+
+# writes to a temp file next to the target and renames it over, so readers never see a partial file
+def atomic_write_text(path, text):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def current_generation(cache_dir=CACHE_DIR):
+    pointer = os.path.join(cache_dir, POINTER_FILE)
+    if not os.path.exists(pointer):
+        return None
+
+    with open(pointer) as f:
+        name = f.read().strip()
+
+    path = os.path.join(cache_dir, name)
+    return path if os.path.isdir(path) else None
+
+
+# seconds since the current generation was published, None when there is no cache
+def cache_age(cache_dir=CACHE_DIR):
+    generation = current_generation(cache_dir)
+    if generation is None:
+        return None
+
+    return time.time() - os.path.getmtime(generation)
+
+
+# loads (returns df, clustered_coins) from the current generation, clusters may be None
+def load_generation(cache_dir=CACHE_DIR):
+    generation = current_generation(cache_dir)
+    if generation is None:
+        return None, None
+
+    df = load_returns(os.path.join(generation, RETURNS_FILE))
+
+    clustered_coins = None
+    clusters_path = os.path.join(generation, CLUSTERS_FILE)
+    if os.path.exists(clusters_path):
+        with open(clusters_path) as f:
+            labels = json.load(f)
+        clustered_coins = pd.Series(labels, name="Cluster").reindex(df.index)
+
+    return df, clustered_coins
+
+
+# builds a new generation directory off to the side, then swaps the pointer to it in one rename
+def publish_generation(df, clustered_coins=None, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+
+    name = f"gen-{time.time_ns()}"
+    tmp_dir = os.path.join(cache_dir, f"{TMP_PREFIX}{name}")
+    os.makedirs(tmp_dir)
+
+    save_returns(df, os.path.join(tmp_dir, RETURNS_FILE))
+
+    if clustered_coins is not None:
+        labels = {str(ticker): int(label) for ticker, label in clustered_coins.items()}
+        with open(os.path.join(tmp_dir, CLUSTERS_FILE), "w") as f:
+            json.dump(labels, f)
+
+    os.rename(tmp_dir, os.path.join(cache_dir, name))
+    atomic_write_text(os.path.join(cache_dir, POINTER_FILE), name)
+
+    prune_generations(cache_dir)
+    return os.path.join(cache_dir, name)
+
+
+# removes all but the newest generations (open memory maps stay valid after unlink on POSIX)
+# along with build directories left behind by publishes that crashed before their rename
+def prune_generations(cache_dir=CACHE_DIR, keep=KEEP_GENERATIONS):
+    names = os.listdir(cache_dir)
+    generations = sorted(name for name in names if name.startswith("gen-"))
+    current = current_generation(cache_dir)
+
+    for name in generations[:-keep]:
+        path = os.path.join(cache_dir, name)
+        if path != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # only directories older than any live publish could be, so a concurrent publish keeps its own
+    for name in names:
+        if not name.startswith(f"{TMP_PREFIX}gen-"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            if time.time() - os.path.getmtime(path) > TMP_MAX_AGE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+# cross-process refresh lock held as a flock on an open descriptor, returns that descriptor (the token
+# release_refresh_lock takes) or None if another refresh holds it. The kernel drops the lock when the holder
+# exits, so a crashed refresh never blocks the next one and a slow live one is never taken over
+def acquire_refresh_lock(cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    fd = os.open(os.path.join(cache_dir, LOCK_FILE), os.O_CREAT | os.O_RDWR, 0o644)
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+    # holder's pid, for diagnostics only
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
+
+
+# the lock file itself stays, removing it would let a waiter lock a file that is already unlinked
+def release_refresh_lock(token, cache_dir=CACHE_DIR):
+    try:
+        fcntl.flock(token, fcntl.LOCK_UN)
+        os.close(token)
+    except OSError:
+        return False
+
+    return True
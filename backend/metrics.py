@@ -0,0 +1,100 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = "fulcrum"
+
+_lock = threading.Lock()
+_counters = {}
+_spans = {}
+
+
+# adds n to a named counter (api_calls, http_429, cache hits/misses, rows_ingested, ...)
+def increment(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def record_span(name, seconds):
+    with _lock:
+        span = _spans.get(name)
+        if span is None:
+            span = _spans[name] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0}
+
+        span["count"] += 1
+        span["total_seconds"] += seconds
+        span["max_seconds"] = max(span["max_seconds"], seconds)
+        span["last_seconds"] = seconds
+
+
+# times the enclosed block under name
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+# decorator form of span, defaults to the function name
+def timed(name=None):
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def snapshot():
+    with _lock:
+        return {"counters": dict(_counters), "spans": {name: dict(span) for name, span in _spans.items()}}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent, sort_keys=True)
+
+
+# Prometheus text exposition format: counters as *_total, spans as *_seconds summaries
+def to_prometheus(prefix=PROMETHEUS_PREFIX):
+    data = snapshot()
+    lines = []
+
+    for name, value in sorted(data["counters"].items()):
+        metric = f"{prefix}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    if data["spans"]:
+        metric = f"{prefix}_span_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for name, span in sorted(data["spans"].items()):
+            lines.append(f'{metric}_count{{span="{name}"}} {span["count"]}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {span["total_seconds"]:.6f}')
+        lines.append(f"# TYPE {prefix}_span_max_seconds gauge")
+        for name, span in sorted(data["spans"].items()):
+            lines.append(f'{prefix}_span_max_seconds{{span="{name}"}} {span["max_seconds"]:.6f}')
+
+    return "\n".join(lines) + "\n"
+
+
+def export(fmt="json"):
+    if fmt == "prometheus":
+        return to_prometheus()
+    if fmt == "json":
+        return to_json()
+    raise ValueError(f"Unknown metrics format: {fmt}")
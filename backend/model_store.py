@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+
+MODEL_DIR = "data/models"
+KEEP_SNAPSHOTS = 5
+
+
+# content hash of the training matrix, its ticker order and the model hyperparameters
+def model_key(df, params):
+    matrix = np.ascontiguousarray(df.to_numpy(dtype=np.float32))
+
+    digest = hashlib.sha256()
+    digest.update(str(matrix.shape).encode())
+    digest.update(matrix.tobytes())
+    digest.update("\0".join(str(ticker) for ticker in df.index).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def k_scores_path(key, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"k-{key}.json")
+
+
+# per-k scores from k_selection.select_k for this key, None if they were never computed
+def load_k_scores(key, model_dir=MODEL_DIR):
+    try:
+        with open(k_scores_path(key, model_dir)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    return entry["scores"] if entry.get("key") == key else None
+
+
+def save_k_scores(key, scores, model_dir=MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+
+    path = k_scores_path(key, model_dir)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump({"key": key, "scores": scores}, f)
+    os.replace(tmp_path, path)
+
+    prune_snapshots(model_dir)
+    return path
+
+
+def snapshot_path(key, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"kmeans-{key}.pkl")
+
+
+# returns (model, clustered_coins) if a snapshot for exactly this key exists, else None
+def load_model(key, model_dir=MODEL_DIR):
+    path = snapshot_path(key, model_dir)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable model snapshot : {e}", file=sys.stderr)
+        return None
+
+    if snapshot.get("key") != key:
+        return None
+
+    return snapshot["model"], snapshot["clustered_coins"]
+
+
+def save_model(key, model, clustered_coins, model_dir=MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+
+    path = snapshot_path(key, model_dir)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"key": key, "model": model, "clustered_coins": clustered_coins}, f)
+    os.replace(tmp_path, path)
+
+    prune_snapshots(model_dir)
+    return path
+
+
+# keeps only the most recently written snapshots and k scores (each kind pruned separately)
+def prune_snapshots(model_dir=MODEL_DIR, keep=KEEP_SNAPSHOTS):
+    for prefix, suffix in (("kmeans-", ".pkl"), ("k-", ".json")):
+        paths = [os.path.join(model_dir, name) for name in os.listdir(model_dir)
+                 if name.startswith(prefix) and name.endswith(suffix)]
+        paths.sort(key=os.path.getmtime)
+
+        for path in paths[:-keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
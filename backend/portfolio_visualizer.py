@@ -1,118 +1,290 @@
-import matplotlib.pyplot as plt
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
+from matplotlib import colormaps, image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from sklearn.decomposition import PCA
-from datetime import datetime
-import os
 
-# creates and saves scatterplot visualization
-def save_portfolio_scatterplot(df, clustered_coins, user_assets, output_dir="data/visualizations"):
-    os.makedirs(output_dir, exist_ok=True)
+from metrics import timed
+from returns_matrix import ReturnsMatrix, as_returns_matrix
+
+DEFAULT_DPI = 300
+DEFAULT_FORMAT = "png"
+# formats written straight from the cached Agg pixels, anything else (svg, pdf, eps) is redrawn as vectors
+RASTER_FORMATS = {"png", "jpg", "jpeg", "tif", "tiff", "webp"}
+BATCH_DPI = 150
+# renderers (projection + rasterized background) kept per process, oldest dropped first
+MAX_RENDERERS = 4
+
+BASE_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+# identifies a (returns matrix, cluster labels) pair, i.e. one trained model
+def model_fingerprint(df, clustered_coins):
+    df = as_returns_matrix(df)
+    labels = clustered_coins.reindex(df.index).fillna(-1).to_numpy(dtype=np.int64)
+
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(df.to_numpy(dtype=np.float32)).tobytes())
+    digest.update("\0".join(df.tickers).encode())
+    digest.update(labels.tobytes())
+    return digest.hexdigest()
+
+
+def cluster_colors(n_clusters):
+    colors = list(BASE_COLORS)
+
+    # extra clusters (when k is chosen automatically) borrow from a qualitative colormap
+    if n_clusters > len(colors):
+        extra = colormaps['tab10'].colors
+        colors = colors + [extra[i % len(extra)] for i in range(n_clusters - len(colors))]
 
-    pca = PCA(n_components=2)
-    pca_components = pca.fit_transform(df)
-
-    pca_df = pd.DataFrame(
-        data=pca_components,
-        columns=['PC1', 'PC2']
-    )
-    pca_df['Ticker'] = df.index
-    pca_df['Cluster'] = clustered_coins.values
-
-    plt.figure(figsize=(14, 10))
-
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A']
-    cluster_names = [f'Cluster {i}' for i in range(len(colors))]
-
-
-    for i in range(len(colors)):
-        cluster_data = pca_df[pca_df['Cluster'] == i]
-        plt.scatter(
-            cluster_data['PC1'],
-            cluster_data['PC2'],
-            c=colors[i],
-            label=cluster_names[i],
-            alpha=0.4,
-            s=80,
-            edgecolors='none'
-        )
-
-    user_data = pca_df[pca_df['Ticker'].isin(user_assets)]
-
-    if not user_data.empty:
-        # plot user assets with larger markers and borders
-        for i in range(len(colors)):
-            user_cluster_data = user_data[user_data['Cluster'] == i]
-            if not user_cluster_data.empty:
-                plt.scatter(
-                    user_cluster_data['PC1'],
-                    user_cluster_data['PC2'],
-                    c=colors[i],
-                    s=300,
-                    alpha=0.9,
-                    edgecolors='black',
-                    linewidths=2.5,
-                    marker='*',
-                    zorder=5
-                )
-
-        # add labels for user's assets
-        for idx, row in user_data.iterrows():
-            plt.annotate(
-                row['Ticker'],
-                (row['PC1'], row['PC2']),
-                fontsize=11,
-                fontweight='bold',
-                alpha=1.0,
-                xytext=(5, 5),
-                textcoords='offset points',
-                bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7, edgecolor='black'),
-                zorder=6
+    return colors
+
+
+# PCA projection and the static layer (every cluster and ticker label), built once per model
+# the static layer is rasterized once per dpi, each render restores those pixels and draws only the portfolio on top
+class ScatterplotRenderer:
+    def __init__(self, df, clustered_coins):
+        df = as_returns_matrix(df)
+
+        # PCA straight off the float32 block, no DataFrame copy
+        pca = PCA(n_components=2)
+        coords = pca.fit_transform(df.to_numpy())
+        self.variance_ratio = pca.explained_variance_ratio_
+
+        # tickers without a cluster label (e.g. added after the model was trained) are left off the plot
+        labels = clustered_coins.reindex(df.index)
+        labelled = labels.notna().to_numpy()
+
+        self.coords = coords[labelled]
+        self.tickers = [ticker for ticker, keep in zip(df.tickers, labelled) if keep]
+        self.rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+        self.labels = labels[labelled].to_numpy(dtype=int)
+        self.colors = cluster_colors(int(self.labels.max()) + 1 if len(self.labels) else 0)
+
+        # one figure per renderer, so renders on the same renderer are serialized
+        self.lock = threading.Lock()
+        self.figure = Figure(figsize=(14, 10), facecolor='white')
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.backgrounds = {}
+        self._draw_background()
+
+    def _draw_background(self):
+        ax = self.ax
+
+        for i, color in enumerate(self.colors):
+            members = self.labels == i
+            ax.scatter(
+                self.coords[members, 0],
+                self.coords[members, 1],
+                color=color,
+                label=f'Cluster {i}',
+                alpha=0.4,
+                s=80,
+                edgecolors='none'
             )
 
-    # add labels for other assets (smaller, more subtle)
-    other_data = pca_df[~pca_df['Ticker'].isin(user_assets)]
-    for idx, row in other_data.iterrows():
-        plt.annotate(
-            row['Ticker'],
-            (row['PC1'], row['PC2']),
-            fontsize=7,
-            alpha=0.5,
-            xytext=(2, 2),
-            textcoords='offset points'
-        )
-
-    # add custom legend entry for user assets
-    if not user_data.empty:
-        plt.scatter([], [], c='gold', s=300, marker='*',
-                   edgecolors='black', linewidths=2.5,
-                   label='Your Portfolio', alpha=0.9)
-
-    variance_ratio = pca.explained_variance_ratio_
-    plt.xlabel(f'First Principal Component ({variance_ratio[0]:.1%} variance)', fontsize=13)
-    plt.ylabel(f'Second Principal Component ({variance_ratio[1]:.1%} variance)', fontsize=13)
-
-    title = 'Asset Clustering Visualization'
-    if user_data.empty:
-        subtitle = f'(Total Variance Explained: {variance_ratio.sum():.1%})'
-    else:
-        subtitle = f'Your {len(user_assets)} Asset{"s" if len(user_assets) > 1 else ""} Highlighted ★ (Total Variance: {variance_ratio.sum():.1%})'
-
-    plt.title(f'{title}\n{subtitle}', fontsize=15, fontweight='bold', pad=20)
-    plt.legend(loc='best', fontsize=10, framealpha=0.9)
-    plt.grid(True, alpha=0.2, linestyle='--')
-    plt.tight_layout()
+        # labels for all assets (smaller, more subtle), portfolio assets get a highlighted label on top
+        for ticker, (x, y) in zip(self.tickers, self.coords):
+            ax.annotate(
+                ticker,
+                (x, y),
+                fontsize=7,
+                alpha=0.5,
+                xytext=(2, 2),
+                textcoords='offset points'
+            )
+
+        ax.set_xlabel(f'First Principal Component ({self.variance_ratio[0]:.1%} variance)', fontsize=13)
+        ax.set_ylabel(f'Second Principal Component ({self.variance_ratio[1]:.1%} variance)', fontsize=13)
+        ax.grid(True, alpha=0.2, linestyle='--')
+
+        # lay out once with room for the two-line title, which is drawn per render
+        ax.set_title('Asset Clustering Visualization\n ', fontsize=15, fontweight='bold', pad=20)
+        self.figure.tight_layout()
+
+        # 'best' legend placement measures every label, so it is found once (with the portfolio entry) and pinned
+        probe = ax.scatter([], [], marker='*', s=300, label='Your Portfolio')
+        legend = ax.legend(loc='best', fontsize=10, framealpha=0.9)
+        self.canvas.draw()
+        self.legend_anchor = tuple(ax.transAxes.inverted().transform(legend.get_window_extent())[0])
+        legend.remove()
+        probe.remove()
+
+        ax.title.set_text('')
+
+    # rasterized static layer at this dpi, drawn the first time it is asked for
+    def _background(self, dpi):
+        self.figure.set_dpi(dpi)
+
+        background = self.backgrounds.get(dpi)
+        if background is None:
+            self.canvas.draw()
+            background = self.canvas.copy_from_bbox(self.figure.bbox)
+            self.backgrounds[dpi] = background
+        else:
+            self.canvas.restore_region(background)
+
+        return background
 
+    # restores the static layer, draws the portfolio layer on top, saves the pixels, then removes the layer again
+    # vector formats skip the cached pixels and save the whole figure with the portfolio layer attached
+    def render(self, user_assets, filepath, dpi=DEFAULT_DPI):
+        with self.lock:
+            ax = self.ax
+            fmt = os.path.splitext(filepath)[1].lstrip(".").lower() or DEFAULT_FORMAT
+            if fmt in RASTER_FORMATS:
+                self._background(dpi)
+            overlay = []
+
+            rows = [self.rows[t] for t in dict.fromkeys(user_assets) if t in self.rows]
+
+            if rows:
+                rows = np.array(rows)
+
+                # plot user assets with larger markers and borders
+                for i, color in enumerate(self.colors):
+                    selected = rows[self.labels[rows] == i]
+                    if len(selected):
+                        overlay.append(ax.scatter(
+                            self.coords[selected, 0],
+                            self.coords[selected, 1],
+                            color=color,
+                            s=300,
+                            alpha=0.9,
+                            edgecolors='black',
+                            linewidths=2.5,
+                            marker='*',
+                            zorder=5
+                        ))
+
+                # add labels for user's assets
+                for row in rows:
+                    overlay.append(ax.annotate(
+                        self.tickers[row],
+                        tuple(self.coords[row]),
+                        fontsize=11,
+                        fontweight='bold',
+                        alpha=1.0,
+                        xytext=(5, 5),
+                        textcoords='offset points',
+                        bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7, edgecolor='black'),
+                        zorder=6
+                    ))
+
+                # add custom legend entry for user assets
+                overlay.append(ax.scatter([], [], c='gold', s=300, marker='*',
+                                          edgecolors='black', linewidths=2.5,
+                                          label='Your Portfolio', alpha=0.9))
+
+            total = self.variance_ratio.sum()
+            title = 'Asset Clustering Visualization'
+            if not len(rows):
+                subtitle = f'(Total Variance Explained: {total:.1%})'
+            else:
+                subtitle = f'Your {len(user_assets)} Asset{"s" if len(user_assets) > 1 else ""} Highlighted ★ (Total Variance: {total:.1%})'
+
+            ax.title.set_text(f'{title}\n{subtitle}')
+            legend = ax.legend(loc='lower left', bbox_to_anchor=self.legend_anchor, borderaxespad=0,
+                               fontsize=10, framealpha=0.9)
+
+            try:
+                if fmt in RASTER_FORMATS:
+                    for artist in overlay + [legend, ax.title]:
+                        ax.draw_artist(artist)
+                    image.imsave(filepath, np.asarray(self.canvas.buffer_rgba()), format=fmt, dpi=dpi)
+                else:
+                    # a full redraw, so vector output keeps real markers and text instead of embedding the bitmap
+                    self.figure.savefig(filepath, format=fmt, dpi=dpi)
+            finally:
+                for artist in overlay:
+                    artist.remove()
+                legend.remove()
+                ax.title.set_text('')
+
+        return filepath
+
+
+# cached renderer for this model, building it (PCA + background) only the first time
+def get_renderer(df, clustered_coins):
+    df = as_returns_matrix(df)
+    key = model_fingerprint(df, clustered_coins)
+
+    with _renderers_lock:
+        renderer = _renderers.get(key)
+        if renderer is None:
+            renderer = ScatterplotRenderer(df, clustered_coins)
+            _renderers[key] = renderer
+            while len(_renderers) > MAX_RENDERERS:
+                _renderers.pop(next(iter(_renderers)))
+
+    return renderer
+
+
+# creates and saves scatterplot visualization
+@timed()
+def save_portfolio_scatterplot(df, clustered_coins, user_assets, output_dir="data/visualizations",
+                               dpi=DEFAULT_DPI, fmt=DEFAULT_FORMAT):
+    os.makedirs(output_dir, exist_ok=True)
+
+    # the suffix keeps concurrent renders in the same second (e.g. from service.py) from overwriting each other
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"portfolio_clusters_{timestamp}.png"
+    filename = f"portfolio_clusters_{timestamp}_{uuid.uuid4().hex[:8]}.{fmt}"
     filepath = os.path.join(output_dir, filename)
 
-    # Save the figure
-    plt.savefig(filepath, dpi=300, bbox_inches='tight', facecolor='white')
-    plt.close()
-
-    return filepath
+    return get_renderer(df, clustered_coins).render(user_assets, filepath, dpi)
 
 
 def generate_cluster_report(df, clustered_coins, user_assets, output_dir="data/visualizations"):
     filepath = save_portfolio_scatterplot(df, clustered_coins, user_assets, output_dir)
     return filepath
+
+
+_worker = {}
+
+
+def _init_render_worker(matrix, tickers, labels):
+    _worker["renderer"] = ScatterplotRenderer(ReturnsMatrix(matrix, tickers), pd.Series(labels, index=tickers))
+
+
+def _render_job(job):
+    name, user_assets, filepath, dpi = job
+    return name, _worker["renderer"].render(user_assets, filepath, dpi)
+
+
+# renders {name: [tickers]} portfolios across a process pool, each worker builds the background once
+# returns {name: filepath}
+@timed()
+def render_portfolios(df, clustered_coins, portfolios, output_dir="data/visualizations/batch",
+                      dpi=BATCH_DPI, fmt=DEFAULT_FORMAT, max_workers=None):
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [
+        (name, list(assets), os.path.join(output_dir, f"portfolio_{name}.{fmt}"), dpi)
+        for name, assets in portfolios.items()
+    ]
+    if not jobs:
+        return {}
+
+    df = as_returns_matrix(df)
+    matrix = np.ascontiguousarray(df.to_numpy())
+    tickers = list(df.tickers)
+    labels = clustered_coins.reindex(df.index).to_numpy()
+
+    workers = min(max_workers or os.cpu_count(), len(jobs))
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                             initargs=(matrix, tickers, labels)) as pool:
+        return dict(pool.map(_render_job, jobs, chunksize=chunksize))
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+DEFAULT_TTL_SECONDS = 45
+DEFAULT_MAX_ENTRIES = 1024
+
+
+# thread-safe TTL cache with LRU eviction once max_entries is reached
+# with a name, lookups are counted as <name>_hits / <name>_misses
+class TTLCache:
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, name=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self.entries[key]
+                entry = None
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        if self.name:
+            metrics.increment(f"{self.name}_{'misses' if entry is None else 'hits'}")
+
+        return None if entry is None else entry[0]
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def set_many(self, values):
+        for key, value in values.items():
+            self.set(key, value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -1,10 +1,16 @@
-import requests
 import pandas as pd
-import time
-import datetime
+import json
+import math
 import os
+import sys
+import threading
+import time
 
 from dotenv import load_dotenv
+from fetch_engine import fetch_all, get_response_cache
+from price_cache import TTLCache
+from ingest import payloads_to_frame
+from metrics import increment, span, timed
 load_dotenv()
 
 COINS = {
@@ -60,89 +66,285 @@ COINS = {
 }
 
 COIN_GECKO_API_KEY = os.getenv("COIN_GECKO_API_KEY")
+# override to point the fetcher at a local stub server
+COIN_GECKO_BASE_URL = os.getenv("COIN_GECKO_BASE_URL", "https://api.coingecko.com/api/v3")
+HISTORY_DAYS = 90
+# raw daily closes (dates x tickers), the last stored date per ticker is its refresh watermark
+HISTORY_FILE = "data/price_history.csv"
+
+# large-universe mode: track the top-N coins by market cap instead of only COINS (0 disables it)
+UNIVERSE_SIZE = int(os.getenv("FULCRUM_UNIVERSE_SIZE", "0"))
+UNIVERSE_FILE = "data/universe.json"
+# tickers that came from bulk dumps (data_sources.py), kept in the returns even though the API does not track them
+INGESTED_FILE = "data/ingested_tickers.json"
+UNIVERSE_MAX_AGE_SECONDS = 86400
+MARKETS_PAGE_SIZE = 250
+# a ticker needs prices on at least this share of the window's days to be kept
+MIN_COVERAGE = 0.8
+
+# ids per /simple/price call, keeps the query string well under URL length limits
+PRICE_BATCH_SIZE = 200
+PRICE_CACHE_TTL_SECONDS = 45
+
+# spot quotes shared by every caller in this process
+price_cache = TTLCache(ttl=PRICE_CACHE_TTL_SECONDS, name="price_cache")
+_price_fetch_lock = threading.Lock()
+_universe = None
+
+# {SYMBOL: coingecko id} for the top_n coins by market cap, paging through /coins/markets
+def discover_coins(top_n, limiter=None):
+    pages = math.ceil(top_n / MARKETS_PAGE_SIZE)
+    jobs = {
+        page: (
+            f"{COIN_GECKO_BASE_URL}/coins/markets",
+            {"vs_currency": "usd", "order": "market_cap_desc", "per_page": MARKETS_PAGE_SIZE,
+             "page": page, "x_cg_demo_api_key": COIN_GECKO_API_KEY},
+        )
+        for page in range(1, pages + 1)
+    }
+    payloads = fetch_all(jobs, limiter=limiter)
+
+    coins = {}
+    for page in sorted(payloads):
+        for market in payloads[page]:
+            symbol = market["symbol"].upper()
+
+            # symbols are not unique on CoinGecko, the larger market cap (listed first) wins
+            if symbol not in coins:
+                coins[symbol] = market["id"]
+
+            if len(coins) >= top_n:
+                return coins
+
+    return coins
+
+# coins tracked by the pipeline: COINS, plus the discovered top-N when UNIVERSE_SIZE is set
+def get_universe(refresh=False):
+    global _universe
+
+    if UNIVERSE_SIZE <= 0:
+        return COINS
+
+    if _universe is not None and not refresh:
+        return _universe
+
+    discovered = None
+    if not refresh and os.path.exists(UNIVERSE_FILE):
+        if time.time() - os.path.getmtime(UNIVERSE_FILE) < UNIVERSE_MAX_AGE_SECONDS:
+            with open(UNIVERSE_FILE) as f:
+                discovered = json.load(f)
+
+    if discovered is None:
+        discovered = discover_coins(UNIVERSE_SIZE)
+
+        tmp_path = f"{UNIVERSE_FILE}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(discovered, f)
+        os.replace(tmp_path, UNIVERSE_FILE)
+
+    # the fixed list always stays in so the theme anchors (USDC, ETH, PEPE, ...) are present
+    _universe = {**discovered, **COINS}
+    return _universe
+
+def load_ingested_tickers(path=INGESTED_FILE):
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return json.load(f)
+
+# adds tickers to the ingested list, written to a temp file and renamed over like the universe
+def record_ingested_tickers(tickers, path=INGESTED_FILE):
+    ingested = list(dict.fromkeys([*load_ingested_tickers(path), *(str(ticker) for ticker in tickers)]))
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(ingested, f)
+    os.replace(tmp_path, path)
+    return ingested
+
+def get_curr_prices(symbols, use_cache=True):
+    symbols = list(dict.fromkeys(symbols))
+    prices = price_cache.get_many(symbols) if use_cache else {}
+
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if not missing:
+        return prices
+
+    # one fetch at a time so concurrent callers reuse quotes instead of racing the API
+    with _price_fetch_lock:
+        if use_cache:
+            prices.update(price_cache.get_many(missing))
+            missing = [symbol for symbol in missing if symbol not in prices]
+
+        fetched = fetch_spot_prices(missing)
+        price_cache.set_many(fetched)
+        prices.update(fetched)
+
+    return prices
 
-def get_curr_prices(symbols):
+# looks up usd prices with multi-id /simple/price calls over the pooled session
+def fetch_spot_prices(symbols, batch_size=PRICE_BATCH_SIZE):
     prices = {}
 
+    universe = get_universe()
+
+    ids = {}
     for symbol in symbols:
+        if symbol in universe:
+            ids[universe[symbol]] = symbol
+        else:
+            print(f"Error finding prices : unknown ticker {symbol}", file=sys.stderr)
+
+    # sorted so the same set of coins always makes the same batches (and response cache keys)
+    id_list = sorted(ids)
+    jobs = {}
+    for start in range(0, len(id_list), batch_size):
+        batch = id_list[start:start + batch_size]
+        jobs[start] = (
+            f"{COIN_GECKO_BASE_URL}/simple/price",
+            {"ids": ",".join(batch), "vs_currencies": "usd", "x_cg_demo_api_key": COIN_GECKO_API_KEY},
+        )
+
+    for info in fetch_all(jobs).values():
+        for coin, coin_info in info.items():
+            if coin in ids and "usd" in coin_info:
+                prices[ids[coin]] = coin_info["usd"]
 
-        coin = COINS[symbol]
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={coin}&vs_currencies=usd&x_cg_demo_api_key={COIN_GECKO_API_KEY}"
+    return prices
 
-        try:
-            data = requests.get(url)
-            info = data.json()
+# days is either one window for every coin or a {symbol: days} map for delta refreshes
+@timed("fetch_history")
+def get_historical_prices(days=HISTORY_DAYS, limiter=None):
+    prices = {}
+
+    universe = get_universe()
+    days_by_symbol = days if isinstance(days, dict) else {symbol: days for symbol in universe}
+
+    # all coins are fetched concurrently, paced by the shared rate limiter
+    jobs = {
+        symbol: (
+            f"{COIN_GECKO_BASE_URL}/coins/{universe[symbol]}/market_chart",
+            {"vs_currency": "usd", "days": coin_days, "x_cg_demo_api_key": COIN_GECKO_API_KEY},
+        )
+        for symbol, coin_days in days_by_symbol.items()
+    }
+    payloads = fetch_all(jobs, limiter=limiter)
 
-            coin_info = info[coin]
-            prices[symbol] = coin_info["usd"]
+    for symbol in days_by_symbol:
+        if symbol not in payloads:
+            continue
+
+        try:
+            # raw [[ms, price], ...] points, bucketed later in one vectorized pass
+            prices[symbol] = payloads[symbol]["prices"]
 
         except Exception as e:
-            print(f"Error finding prices : {e}")
-        
-    return prices
+            print(f"Error finding prices : {e}", file=sys.stderr)
 
-def get_historical_prices():
-    prices = {}
+    return prices
 
-    for symbol, id in COINS.items():
-        url = f"https://api.coingecko.com/api/v3/coins/{id}/market_chart?vs_currency=usd&days=90&x_cg_demo_api_key={COIN_GECKO_API_KEY}"
+# turns {ticker: [[ms, price], ...]} into closes (UTC days, or hours), one column per ticker
+def prices_to_frame(prices, granularity="daily"):
+    increment("rows_ingested", sum(len(points) for points in prices.values()))
+    with span("parse_history"):
+        return payloads_to_frame(prices, granularity)
 
-        try:
-            data = requests.get(url)
-            info = data.json()
+def load_price_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return None
 
-            coin_prices = info["prices"]
+    return pd.read_csv(path, index_col=0, parse_dates=True)
 
-            formatted_prices = []
+# written to a temp file and renamed over so a crash never leaves a truncated history
+def save_price_history(history, path=HISTORY_FILE):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    history.to_csv(tmp_path, index=True)
+    os.replace(tmp_path, path)
 
-            for price in coin_prices:
-                ms = price[0]
-                s = ms / 1000.0
-                date = datetime.datetime.fromtimestamp(s)
-                formatted_date = date.strftime("%m-%d-%Y")
-                formatted_prices.append([formatted_date, price[1]])
+# last day with a stored close for each ticker
+def get_watermarks(history):
+    return {ticker: history[ticker].last_valid_index() for ticker in history.columns}
 
-            prices[symbol] = formatted_prices
+# days to request per coin so that only the gap since its watermark is fetched
+def get_missing_days(history, today=None):
+    if today is None:
+        today = pd.Timestamp.now().normalize()
 
-        except Exception as e:
-            print(f"Error finding prices : {e}")
+    watermarks = get_watermarks(history) if history is not None else {}
+    days = {}
 
-        time.sleep(2)
+    for symbol in get_universe():
+        mark = watermarks.get(symbol)
 
-    return prices
+        if mark is None or pd.isna(mark):
+            days[symbol] = HISTORY_DAYS
+        else:
+            # the watermark day itself is refetched since it may have been stored mid-day
+            days[symbol] = min(HISTORY_DAYS, max(1, (today - mark).days))
 
-def generate_df():
-    prices = get_historical_prices()
+    return days
 
-    df_list = []
+# fetches only the days missing since each ticker's watermark and appends them
+def refresh_price_history(history=None):
+    if history is None:
+        history = load_price_history()
 
-    for ticker, data in prices.items():
-        df = pd.DataFrame(data, columns=['date', 'price'])
+    days = get_missing_days(history)
+    delta = prices_to_frame(get_historical_prices(days=days))
 
-        # converts dates to pd dates
-        df['date'] = pd.to_datetime(df['date'])
+    if history is None or history.empty:
+        return delta
 
-        # groups all prices on singular day into and chooses last to represent, then puts into df
-        df = df.groupby(df['date'].dt.date)['price'].last().to_frame()
+    if delta.empty:
+        return history
 
-        # renames price column to name of ticker
-        df.columns = [ticker]
+    # freshly fetched closes win over the stored (possibly partial) ones
+    return delta.combine_first(history).sort_index()
 
-        df_list.append(df)
+# trailing-window % returns, one row per ticker and one column per date
+# missing prices only blank out that ticker's days instead of dropping the date for everyone
+# tickers defaults to the tracked universe plus any tickers ingested from dumps
+def compute_returns(history, window=HISTORY_DAYS, min_coverage=MIN_COVERAGE, tickers=None):
+    if tickers is None:
+        tickers = list(dict.fromkeys([*get_universe(), *load_ingested_tickers()]))
+    tickers = [ticker for ticker in tickers if ticker in history.columns]
 
-    merged = pd.concat(df_list, axis=1)
-    merged = merged.dropna()
+    merged = history[tickers].tail(window + 1)
 
     # changes from prices to % return - normalizes
-    merged_pct = merged.pct_change().dropna()
+    merged_pct = merged.pct_change(fill_method=None).iloc[1:]
+    merged_pct = merged_pct.dropna(how="all")
+
+    observed = merged_pct.notna()
+
+    # drop tickers with too little history in the window, the rest get their own mean return on missing days
+    # (0% would make a newly listed coin look as flat as a stablecoin to KMeans)
+    keep = observed.mean() >= min_coverage
+    merged_pct = merged_pct.loc[:, keep]
+    merged_pct = merged_pct.fillna(merged_pct.mean())
 
     final_merged = merged_pct.T
     final_merged.index.name = "Ticker"
 
-    final_merged.to_csv("data/market_prices.csv", index=True)
-
     return final_merged
 
+@timed()
+def generate_df(incremental=True):
+    # a delta refresh asks for a date-dependent number of days, which a recording from another day never has,
+    # so offline replay always requests the full window
+    if get_response_cache().offline:
+        incremental = False
+
+    if incremental:
+        history = refresh_price_history()
+    else:
+        history = prices_to_frame(get_historical_prices())
+
+    save_price_history(history)
+
+    return compute_returns(history)
+
 def main():
     symbols = ["BTC", "SOL", "ETH", "USDC", "PEPE"]    
     res = get_curr_prices(symbols)
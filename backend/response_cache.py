@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+CACHE_DIR = "data/http_cache"
+
+# seconds a recorded response stays fresh, matched on the request path
+ENDPOINT_TTLS = {
+    "/simple/price": 60,
+    "/market_chart": 3600,
+    "/coins/markets": 86400,
+}
+DEFAULT_TTL_SECONDS = 300
+
+# recorded responses are pruned on write: anything older than MAX_AGE_SECONDS, then the oldest beyond MAX_ENTRIES
+MAX_AGE_SECONDS = 7 * 86400
+MAX_ENTRIES = 5000
+# the directory is scanned on the first write and then every PRUNE_EVERY writes
+PRUNE_EVERY = 200
+
+# query params that identify the caller rather than the data, left out of the cache key
+IGNORED_PARAMS = {"x_cg_demo_api_key", "x_cg_pro_api_key"}
+
+
+class OfflineCacheMiss(Exception):
+    pass
+
+
+# persistent JSON response cache keyed by endpoint + params, doubling as the recording for offline replay
+class ResponseCache:
+    def __init__(self, cache_dir=CACHE_DIR, offline=False, ttls=None, max_age=MAX_AGE_SECONDS, max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.ttls = ENDPOINT_TTLS if ttls is None else ttls
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def key(self, url, params=None):
+        params = {k: str(v) for k, v in (params or {}).items() if k not in IGNORED_PARAMS}
+        path = urlparse(url).path
+        raw = json.dumps({"path": path, "params": params}, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def ttl(self, url):
+        path = urlparse(url).path
+        for endpoint, ttl in self.ttls.items():
+            if endpoint in path:
+                return ttl
+        return DEFAULT_TTL_SECONDS
+
+    def get(self, url, params=None):
+        path = self.path(self.key(url, params))
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, url, entry):
+        return time.time() - entry["fetched_at"] < self.ttl(url)
+
+    # conditional request headers so an unchanged resource can come back as a cheap 304
+    def revalidation_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, params, body, headers=None):
+        headers = headers or {}
+        entry = {
+            "url": urlparse(url).path,
+            "params": {k: v for k, v in (params or {}).items() if k not in IGNORED_PARAMS},
+            "fetched_at": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "body": body,
+        }
+        self._write(url, params, entry)
+        return entry
+
+    # marks a revalidated (304) entry as fresh again
+    def touch(self, url, params, entry):
+        entry["fetched_at"] = time.time()
+        self._write(url, params, entry)
+
+    def _write(self, url, params, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(self.key(url, params))
+        tmp_path = f"{path}.tmp-{os.getpid()}-{id(entry)}"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            prune = self.writes % PRUNE_EVERY == 0
+            self.writes += 1
+        if prune:
+            self.prune()
+
+    # removes expired recordings and caps the entry count, returns how many files were removed
+    def prune(self):
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        except FileNotFoundError:
+            return 0
+
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+
+        cutoff = time.time() - self.max_age
+        expired = [path for mtime, path in entries if mtime < cutoff]
+        live = [path for mtime, path in entries if mtime >= cutoff]
+        overflow = live[:max(0, len(live) - self.max_entries)]
+
+        removed = 0
+        for path in expired + overflow:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+# FULCRUM_OFFLINE=1 replays recorded responses only and never touches the network
+def cache_from_env():
+    offline = os.getenv("FULCRUM_OFFLINE", "").lower() in ("1", "true", "yes")
+    return ResponseCache(os.getenv("FULCRUM_HTTP_CACHE_DIR", CACHE_DIR), offline=offline)
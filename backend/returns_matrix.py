@@ -0,0 +1,106 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# daily returns (tickers x dates) as one float32 block with an interned ticker -> row lookup
+# exposes the small part of the DataFrame API the rest of the code uses (index, columns, to_numpy,
+# shape, len) so it can stand in for the returns DataFrame without copies
+class ReturnsMatrix:
+    def __init__(self, values, tickers, dates=None):
+        # float32 arrays (including memory maps and window views) are kept as they are
+        values = np.asarray(values)
+        if values.dtype != np.float32:
+            values = np.ascontiguousarray(values, dtype=np.float32)
+
+        self.values = values
+        self.tickers = tuple(sys.intern(str(ticker)) for ticker in tickers)
+        self.rows = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.dates = pd.Index(range(values.shape[1]) if dates is None else dates)
+        self._index = None
+
+        if len(self.tickers) != values.shape[0] or len(self.dates) != values.shape[1]:
+            raise ValueError(f"Returns matrix is {values.shape}, got {len(self.tickers)} tickers and {len(self.dates)} dates.")
+
+    @classmethod
+    def from_frame(cls, df):
+        if 'Ticker' in df.columns:
+            df = df.set_index('Ticker')
+        return cls(np.ascontiguousarray(df.to_numpy(dtype=np.float32)), df.index, df.columns)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def __repr__(self):
+        return f"ReturnsMatrix({self.shape[0]} tickers x {self.shape[1]} dates)"
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    # ticker axis as a pandas Index (built once), for reindexing cluster labels
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = pd.Index(self.tickers, name="Ticker")
+        return self._index
+
+    @property
+    def columns(self):
+        return self.dates
+
+    # the backing array itself unless another dtype is asked for
+    def to_numpy(self, dtype=None, copy=False):
+        if dtype is None or np.dtype(dtype) == self.values.dtype:
+            return self.values.copy() if copy else self.values
+        return self.values.astype(dtype)
+
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=self.index, columns=self.dates, copy=False)
+
+    def row(self, ticker):
+        return self.values[self.rows[ticker]]
+
+    # row positions of tickers, unknown tickers are skipped
+    def positions(self, tickers):
+        return np.array([self.rows[t] for t in tickers if t in self.rows], dtype=np.intp)
+
+    # boolean row mask for tickers, replaces index.isin
+    def mask(self, tickers):
+        mask = np.zeros(len(self.tickers), dtype=bool)
+        mask[self.positions(tickers)] = True
+        return mask
+
+    # date window [start, stop) by position or date label, always a view
+    def window(self, start=None, stop=None):
+        start = self.dates.get_loc(start) if start is not None and not isinstance(start, (int, np.integer)) else start
+        stop = self.dates.get_loc(stop) + 1 if stop is not None and not isinstance(stop, (int, np.integer)) else stop
+        dates = self.dates[start:stop]
+        return ReturnsMatrix(self.values[:, start:stop], self.tickers, dates)
+
+    # the last n days, a view
+    def tail(self, n):
+        return self.window(max(0, self.shape[1] - n))
+
+    # rows for tickers, in the given order: a view when they are a contiguous run, a float32 gather otherwise
+    def subset(self, tickers):
+        positions = self.positions(tickers)
+        tickers = [self.tickers[i] for i in positions]
+
+        if len(positions) and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+            values = self.values[positions[0]:positions[0] + len(positions)]
+        else:
+            values = self.values.take(positions, axis=0)
+
+        return ReturnsMatrix(values, tickers, self.dates)
+
+
+# accepts a ReturnsMatrix or a returns DataFrame (tickers as index or a 'Ticker' column)
+def as_returns_matrix(data):
+    if isinstance(data, ReturnsMatrix):
+        return data
+    return ReturnsMatrix.from_frame(data)
@@ -0,0 +1,35 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from returns_matrix import ReturnsMatrix
+
+
+# sidecar holding the ticker (row) and date (column) indexes for the matrix file
+def index_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+# writes the returns (tickers x dates) as a contiguous float32 matrix plus its index sidecar
+def save_returns(df, path):
+    matrix = np.ascontiguousarray(df.to_numpy(dtype=np.float32))
+    np.save(path, matrix)
+
+    index = {
+        "tickers": [str(ticker) for ticker in df.index],
+        "dates": [pd.Timestamp(date).strftime("%Y-%m-%d") for date in df.columns],
+    }
+    with open(index_path(path), "w") as f:
+        json.dump(index, f)
+
+
+# memory-maps the matrix read-only and wraps it in a ReturnsMatrix without copying
+def load_returns(path):
+    matrix = np.load(path, mmap_mode="r")
+
+    with open(index_path(path)) as f:
+        index = json.load(f)
+
+    return ReturnsMatrix(matrix, index["tickers"], index["dates"])
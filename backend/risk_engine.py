@@ -0,0 +1,201 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from returns_matrix import as_returns_matrix
+
+CONFIDENCE = 0.95
+HORIZON_DAYS = 1
+TRADING_DAYS = 365
+MC_PATHS = 1_000_000
+# paths drawn per NumPy batch, bounds memory at MC_BATCH x assets floats
+MC_BATCH = 100_000
+RANDOM_STATE = 42
+# added to the covariance diagonal when it is not positive definite (e.g. a stablecoin with ~0 variance)
+JITTER = 1e-12
+# times the jitter is grown tenfold before falling back to clipping negative eigenvalues
+MAX_JITTER_ATTEMPTS = 6
+
+
+# value weights of a {ticker: quantity} portfolio over the tickers the returns matrix knows
+# returns (tickers, weights, total value), weights sum to 1
+def portfolio_weights(holdings, prices, known):
+    tickers = []
+    values = []
+    for coin, quantity in holdings.items():
+        value = prices.get(coin, 0) * quantity
+        if coin in known and value > 0:
+            tickers.append(coin)
+            values.append(value)
+
+    values = np.array(values, dtype=np.float64)
+    total = float(values.sum())
+    return tickers, (values / total if total > 0 else values), total
+
+
+# factor L with L L^T == cov, lower-triangular unless the eigenvalue fallback was needed
+def _cholesky(cov):
+    if not np.isfinite(cov).all():
+        raise ValueError("Covariance has NaN or infinite entries (an asset with too short a history?).")
+
+    jitter = JITTER
+    for _ in range(MAX_JITTER_ATTEMPTS):
+        try:
+            return np.linalg.cholesky(cov + jitter * np.eye(len(cov)))
+        except np.linalg.LinAlgError:
+            jitter *= 10
+
+    values, vectors = np.linalg.eigh(cov)
+    return vectors * np.sqrt(np.clip(values, 0.0, None))
+
+
+def _tail(losses, confidence):
+    var = float(np.quantile(losses, confidence))
+    tail = losses[losses >= var]
+    return var, float(tail.mean()) if len(tail) else var
+
+
+# one shard of Monte Carlo paths, returns the portfolio loss (fraction of value) per path
+def _simulate_shard(args):
+    chol, mu, weights, n_paths, horizon, batch_size, seed = args
+    rng = np.random.default_rng(seed)
+    losses = np.empty(n_paths)
+
+    with threadpool_limits(1):
+        for start in range(0, n_paths, batch_size):
+            size = min(batch_size, n_paths - start)
+            wealth = np.ones(size)
+
+            # correlated daily returns z L^T + mu, compounded over the horizon with fixed weights
+            for _ in range(horizon):
+                z = rng.standard_normal((size, len(mu)), dtype=np.float32)
+                daily = z @ chol.T + mu
+                wealth *= 1.0 + daily @ weights
+
+            losses[start:start + size] = 1.0 - wealth
+
+    return losses
+
+
+# covariance risk over the cached returns matrix (tickers x days of daily % returns)
+class RiskEngine:
+    def __init__(self, returns_df):
+        returns_df = as_returns_matrix(returns_df)
+
+        self.tickers = list(returns_df.tickers)
+        self.rows = returns_df.rows
+        # days x assets, so a portfolio's daily returns are returns @ weights
+        self.returns = np.ascontiguousarray(returns_df.to_numpy(dtype=np.float64).T)
+        self.mean = self.returns.mean(axis=0)
+        self.cov = np.cov(self.returns, rowvar=False)
+        self._factors = {}
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def _index(self, tickers):
+        return np.array([self.rows[ticker] for ticker in tickers], dtype=np.intp)
+
+    # (mean, covariance) restricted to tickers
+    def moments(self, tickers):
+        idx = self._index(tickers)
+        return self.mean[idx], self.cov[np.ix_(idx, idx)]
+
+    # Cholesky factor of the tickers' covariance, computed once per ticker set
+    def cholesky(self, tickers):
+        key = tuple(tickers)
+        factor = self._factors.get(key)
+        if factor is None:
+            factor = _cholesky(self.moments(tickers)[1])
+            self._factors[key] = factor
+        return factor
+
+    # daily and annualized volatility of the weighted portfolio
+    def volatility(self, tickers, weights):
+        _, cov = self.moments(tickers)
+        daily = float(np.sqrt(max(weights @ cov @ weights, 0.0)))
+        return daily, float(daily * np.sqrt(TRADING_DAYS))
+
+    # normal-approximation VaR and CVaR as positive loss fractions
+    def parametric_var(self, tickers, weights, confidence=CONFIDENCE, horizon=HORIZON_DAYS):
+        mu, _ = self.moments(tickers)
+        daily_vol, _ = self.volatility(tickers, weights)
+
+        mean = float(mu @ weights) * horizon
+        sigma = daily_vol * np.sqrt(horizon)
+        z = NormalDist().inv_cdf(confidence)
+
+        var = sigma * z - mean
+        cvar = sigma * NormalDist().pdf(z) / (1 - confidence) - mean
+        return float(var), float(cvar)
+
+    # VaR and CVaR from the realized portfolio returns over the window (overlapping sums for horizon > 1)
+    def historical_var(self, tickers, weights, confidence=CONFIDENCE, horizon=HORIZON_DAYS):
+        daily = self.returns[:, self._index(tickers)] @ weights
+        if horizon > 1:
+            wealth = np.cumprod(np.concatenate([[1.0], 1.0 + daily]))
+            daily = wealth[horizon:] / wealth[:-horizon] - 1.0
+        return _tail(-daily, confidence)
+
+    # marginal risk and per-holding share of portfolio volatility (Euler decomposition, shares sum to 1)
+    def risk_contributions(self, tickers, weights):
+        _, cov = self.moments(tickers)
+        daily_vol, _ = self.volatility(tickers, weights)
+        if daily_vol == 0:
+            return {ticker: 0.0 for ticker in tickers}, {ticker: 0.0 for ticker in tickers}
+
+        marginal = cov @ weights / daily_vol
+        contribution = weights * marginal
+        return dict(zip(tickers, marginal.tolist())), dict(zip(tickers, (contribution / daily_vol).tolist()))
+
+    # Monte Carlo VaR/CVaR from correlated normal return paths, sharded over a process pool
+    def monte_carlo_var(self, tickers, weights, confidence=CONFIDENCE, horizon=HORIZON_DAYS, n_paths=MC_PATHS,
+                        batch_size=MC_BATCH, max_workers=None, random_state=RANDOM_STATE):
+        mu, _ = self.moments(tickers)
+        chol = self.cholesky(tickers).astype(np.float32)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        workers = max(1, min(max_workers or os.cpu_count(), -(-n_paths // batch_size)))
+        sizes = [n_paths // workers + (1 if i < n_paths % workers else 0) for i in range(workers)]
+        seeds = np.random.SeedSequence(random_state).spawn(workers)
+        jobs = [(chol, mu, weights, size, horizon, batch_size, seed) for size, seed in zip(sizes, seeds)]
+
+        if workers == 1:
+            losses = _simulate_shard(jobs[0])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                losses = np.concatenate(list(pool.map(_simulate_shard, jobs)))
+
+        return _tail(losses, confidence)
+
+    # every measure for one {ticker: quantity} portfolio; VaR/CVaR are fractions of portfolio value
+    def report(self, holdings, prices, confidence=CONFIDENCE, horizon=HORIZON_DAYS, n_paths=0):
+        tickers, weights, total = portfolio_weights(holdings, prices, self.rows)
+        if not tickers:
+            return None
+
+        daily_vol, annual_vol = self.volatility(tickers, weights)
+        parametric = self.parametric_var(tickers, weights, confidence, horizon)
+        historical = self.historical_var(tickers, weights, confidence, horizon)
+        marginal, contributions = self.risk_contributions(tickers, weights)
+
+        report = {
+            "total_value": total,
+            "confidence": confidence,
+            "horizon_days": horizon,
+            "daily_volatility": daily_vol,
+            "annual_volatility": annual_vol,
+            "parametric": {"var": parametric[0], "cvar": parametric[1]},
+            "historical": {"var": historical[0], "cvar": historical[1]},
+            "marginal_risk": marginal,
+            "risk_contribution": contributions,
+        }
+
+        if n_paths:
+            var, cvar = self.monte_carlo_var(tickers, weights, confidence, horizon, n_paths)
+            report["monte_carlo"] = {"var": var, "cvar": cvar, "paths": n_paths}
+
+        return report
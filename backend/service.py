@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from cluster_index import ClusterIndex
+from hedge_index import HedgeIndex
+from hedge_optimizer import HedgeOptimizer
+import metrics
+from main import CACHE_DIR, get_market_data, hedge_summary, portfolio_summary, train_model
+from market_cache import current_generation
+from portfolio_visualizer import save_portfolio_scatterplot
+from price_fetcher import get_curr_prices
+from risk_engine import RiskEngine
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# how often the service looks for a newly published cache generation
+RELOAD_INTERVAL_SECONDS = 60
+MAX_BODY_BYTES = 1_000_000
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# everything a request needs, built once and swapped as a whole when new data is published
+class AnalysisState:
+    def __init__(self, df, clusters, generation):
+        self.df = df
+        self.clusters = clusters
+        self.index = ClusterIndex(clusters)
+        self.hedge_index = HedgeIndex(df)
+        self.risk_engine = RiskEngine(df)
+        self.hedge_optimizer = HedgeOptimizer(self.risk_engine)
+        self.generation = generation
+        self.loaded_at = time.time()
+
+
+# market_data is a (df, cached clusters) pair already returned by get_market_data, to avoid loading it twice
+def load_state(previous=None, market_data=None):
+    df, cached_clusters = market_data if market_data is not None else get_market_data()
+    clusters = train_model(df, previous_clusters=cached_clusters if previous is None else previous.clusters)
+    return AnalysisState(df, clusters, current_generation(CACHE_DIR))
+
+
+class AnalysisService:
+    def __init__(self, state):
+        self.state = state
+        # network lookups run on a pool, matplotlib is not thread-safe so plots get their own thread
+        self.io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prices")
+        self.plot_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plots")
+        self.reload_lock = threading.Lock()
+
+    # request handlers return (status, json-able body)
+    async def handle(self, method, path, body):
+        parts = [unquote(part) for part in urlparse(path).path.strip("/").split("/") if part]
+
+        if parts == ["health"]:
+            state = self.state
+            return 200, {"status": "ok", "assets": len(state.df), "generation": state.generation,
+                         "loaded_at": state.loaded_at}
+
+        # Prometheus text by default, ?format=json for the raw snapshot
+        if parts == ["metrics"]:
+            if "format=json" in urlparse(path).query:
+                return 200, metrics.snapshot()
+            return 200, metrics.to_prometheus()
+
+        if len(parts) == 2 and parts[0] == "hedge":
+            if method != "GET":
+                raise HttpError(405, "use GET")
+            return self.hedge(parts[1].upper())
+
+        if parts == ["portfolio"]:
+            if method != "POST":
+                raise HttpError(405, "use POST")
+            return await self.portfolio(parse_holdings(body))
+
+        if parts == ["visualize"]:
+            if method != "POST":
+                raise HttpError(405, "use POST")
+            return await self.visualize(parse_holdings(body))
+
+        raise HttpError(404, f"no route for {path}")
+
+    def hedge(self, ticker):
+        state = self.state
+        summary = hedge_summary(ticker, state.index, state.hedge_index)
+        if summary is None:
+            raise HttpError(404, f"{ticker} not found in database")
+        return 200, summary
+
+    async def portfolio(self, holdings):
+        state = self.state
+        loop = asyncio.get_running_loop()
+        prices = await loop.run_in_executor(self.io_pool, get_curr_prices, list(holdings))
+        # the risk and hedge solves are CPU work, kept off the event loop like the price lookup
+        summary = await loop.run_in_executor(self.io_pool, portfolio_summary, holdings, prices,
+                                             state.index, state.risk_engine, state.hedge_optimizer)
+        return 200, summary
+
+    async def visualize(self, holdings):
+        state = self.state
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(self.plot_pool, save_portfolio_scatterplot,
+                                          state.df, state.clusters, list(holdings))
+        return 200, {"path": path}
+
+    # picks up a generation published by a background refresh without blocking requests
+    async def reload_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL_SECONDS)
+            try:
+                await loop.run_in_executor(self.io_pool, self.reload_if_changed)
+            except Exception as e:
+                print(f"Reload failed : {e}")
+
+    def reload_if_changed(self):
+        with self.reload_lock:
+            market_data = get_market_data()
+            if current_generation(CACHE_DIR) == self.state.generation:
+                return False
+
+            self.state = load_state(self.state, market_data)
+            print(f"Loaded new market data generation: {self.state.generation}")
+            return True
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+
+                start = time.perf_counter()
+                metrics.increment("http_requests")
+                try:
+                    status, payload = await self.handle(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+
+                metrics.record_span("http_request", time.perf_counter() - start)
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HttpError as e:
+            writer.write(encode_response(e.status, {"error": str(e)}, False))
+        finally:
+            writer.close()
+
+
+def parse_holdings(body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HttpError(400, "body must be JSON")
+
+    holdings = data.get("holdings", data) if isinstance(data, dict) else None
+    if not isinstance(holdings, dict) or not holdings:
+        raise HttpError(400, 'expected {"holdings": {"BTC": 0.5, ...}}')
+
+    try:
+        return {str(ticker).upper(): float(amount) for ticker, amount in holdings.items()}
+    except (TypeError, ValueError):
+        raise HttpError(400, "holding amounts must be numbers")
+
+
+# minimal HTTP/1.1 request reader, returns None when the client closed the connection
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = parse_content_length(headers.get("content-length"))
+
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+# Content-Length as a non-negative int no larger than MAX_BODY_BYTES
+def parse_content_length(value):
+    if value is None or value == "":
+        return 0
+
+    try:
+        length = int(value)
+    except ValueError:
+        raise HttpError(400, "malformed Content-Length")
+
+    if length < 0:
+        raise HttpError(400, "malformed Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "request body too large")
+    return length
+
+
+# str payloads (the metrics endpoint) go out as plain text, everything else as JSON
+def encode_response(status, payload, keep_alive=True):
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload, default=str).encode(), "application/json"
+
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+async def run_service(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    print("Loading market data and model...")
+    service = AnalysisService(load_state())
+
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"Fulcrum analysis service listening on http://{host}:{port}")
+
+    reloader = asyncio.create_task(service.reload_forever())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        reloader.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve hedge and portfolio analysis over HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_service(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
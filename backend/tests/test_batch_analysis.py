@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from batch_analysis import (ALTCOIN_HEAVY, BARBELL, EMPTY, HEALTHY, LIQUIDITY_DANGER, analyze_portfolios,
+                            holdings_matrix, price_vector)
+from cluster_index import ClusterIndex
+
+CLUSTERS = pd.Series(
+    [0, 0, 1, 1, 2, 2, 3, 3],
+    index=["USDC", "DAI", "ETH", "BTC", "PEPE", "SHIB", "LINK", "UNI"],
+)
+PRICES = {"USDC": 1.0, "DAI": 1.0, "ETH": 2000.0, "BTC": 50000.0, "PEPE": 1e-5, "SHIB": 2e-5,
+          "LINK": 10.0, "UNI": 5.0, "FAKE": 100.0}
+
+
+# percentages per theme the way analyze_portfolio computes them, one portfolio at a time
+def single_path(portfolio, index):
+    values = {}
+    for coin, quantity in portfolio.items():
+        if coin in index:
+            key = index.cluster_key[index.cluster_of(coin)]
+            values[key] = values.get(key, 0.0) + PRICES[coin] * quantity
+
+    total = sum(values.values())
+    return total, {key: value / total * 100 for key, value in values.items()}
+
+
+def test_batch_matches_the_single_portfolio_path():
+    index = ClusterIndex(CLUSTERS)
+    tickers = list(CLUSTERS.index) + ["FAKE"]
+    portfolios = [
+        {"USDC": 500, "ETH": 1, "PEPE": 1e7, "FAKE": 3},
+        {"LINK": 100, "UNI": 50, "BTC": 0.01},
+        {"DAI": 10, "SHIB": 5e6},
+    ]
+
+    summary = analyze_portfolios(holdings_matrix(portfolios, tickers), price_vector(PRICES, tickers), index, tickers)["summary"]
+
+    for row, portfolio in enumerate(portfolios):
+        total, pct = single_path(portfolio, index)
+        assert summary.loc[row, "Total Value"] == pytest.approx(total)
+        for key in ("Safe Haven", "Blue Chips", "High Volatility", "Altcoins"):
+            assert summary.loc[row, f"{key} %"] == pytest.approx(pct.get(key, 0.0))
+
+
+def test_diagnoses_follow_the_decision_tree():
+    index = ClusterIndex(CLUSTERS)
+    tickers = list(CLUSTERS.index)
+    portfolios = [
+        {"USDC": 400, "PEPE": 4e7, "LINK": 20},  # 40% safe, 40% vol, no blue chips
+        {"LINK": 50, "UNI": 50, "USDC": 100},     # mostly altcoins
+        {"ETH": 1, "USDC": 20, "LINK": 50},       # ~1% cash
+        {"ETH": 1, "USDC": 300, "PEPE": 1e7, "LINK": 10},
+        {},
+    ]
+
+    summary = analyze_portfolios(holdings_matrix(portfolios, tickers), price_vector(PRICES, tickers), index, tickers)["summary"]
+
+    assert summary["Diagnosis"].tolist() == [BARBELL, ALTCOIN_HEAVY, LIQUIDITY_DANGER, HEALTHY, EMPTY]
+    assert summary.loc[0, "Target Cluster"] == index.theme_cluster["Blue Chips"]
+    assert summary.loc[4, "Target Cluster"] == -1
+
+
+def test_weights_sum_to_one_per_nonempty_portfolio():
+    tickers = list(CLUSTERS.index)
+    portfolios = [{"ETH": 1, "USDC": 10}, {}]
+
+    weights = analyze_portfolios(holdings_matrix(portfolios, tickers), price_vector(PRICES, tickers), CLUSTERS, tickers)["weights"]
+
+    np.testing.assert_allclose(np.asarray(weights.sum(axis=1)).ravel(), [1.0, 0.0])
+
+
+def test_classify_clusters_accepts_a_series_or_an_index():
+    assert main.classify_clusters(0, CLUSTERS) == "Safe Haven (Stablecoins)"
+    assert main.classify_clusters(3, ClusterIndex(CLUSTERS)) == "Altcoins (Mid-Cap)"
@@ -0,0 +1,41 @@
+import os
+import platform
+
+from benchmark import StubMarket, find_regressions, machine_mismatch
+
+
+def results(**stages):
+    return {"results": {"50": {"stages": stages}}}
+
+
+def test_slower_stage_beyond_tolerance_and_min_delta_is_reported():
+    regressions = find_regressions(results(fetch=1.0, parse=0.01), results(fetch=1.5, parse=0.02),
+                                   tolerance=0.25, min_delta=0.05)
+
+    # parse doubled but only by 10ms, below min_delta
+    assert regressions == [("50", "fetch", 1.0, 1.5)]
+
+
+def test_stages_and_sizes_missing_from_the_baseline_are_skipped():
+    current = {"results": {"50": {"stages": {"new_stage": 5.0}}, "500": {"stages": {"fetch": 9.0}}}}
+
+    assert find_regressions(results(fetch=1.0), current) == []
+
+
+def test_stub_prices_for_a_date_do_not_depend_on_the_requested_window():
+    market = StubMarket({"BTC": "bitcoin", "USDC": "usd-coin"}, n_assets=3, throttle_every=0)
+
+    for coin_id in ("bitcoin", "usd-coin", "bench-0"):
+        short = dict(map(tuple, market.chart(coin_id, 5)["prices"]))
+        long = dict(map(tuple, market.chart(coin_id, 90)["prices"]))
+
+        assert len(short) == 6 and len(long) == 91
+        assert all(long[ms] == price for ms, price in short.items())
+        assert market.simple_price([coin_id])[coin_id]["usd"] == short[max(short)]
+
+
+def test_baselines_from_other_hardware_are_flagged():
+    here = {"machine": platform.machine(), "cpus": os.cpu_count()}
+
+    assert machine_mismatch(here) == []
+    assert machine_mismatch({**here, "cpus": here["cpus"] + 1}) == [("cpus", here["cpus"] + 1, here["cpus"])]
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import correlation_analyzer
+from correlation_analyzer import RollingCorrelation, daily_returns, rolling_correlations
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(0)
+    market = rng.normal(0, 0.03, 200)
+    data = {f"C{i}": (0.5 + i / 4) * market + rng.normal(0, 0.01 * (i + 1), 200) for i in range(6)}
+    return pd.DataFrame(data, index=pd.date_range("2024-01-01", periods=200))
+
+
+def test_streamed_correlation_matches_dataframe_corr_on_every_window(returns):
+    window = 30
+    for date, corr, _ in rolling_correlations(returns, window):
+        expected = returns.loc[:date].tail(window).corr().to_numpy()
+        np.testing.assert_allclose(corr, expected, atol=1e-9)
+
+
+def test_periodic_recompute_keeps_the_running_sums_exact(returns, monkeypatch):
+    monkeypatch.setattr(correlation_analyzer, "RECOMPUTE_EVERY", 7)
+    engine = RollingCorrelation(returns.columns, window=20)
+    for date, row in zip(returns.index, returns.to_numpy()):
+        engine.append(date, row)
+
+    np.testing.assert_allclose(engine.covariance(), returns.tail(20).cov().to_numpy(), atol=1e-12)
+
+
+def test_history_and_drift(returns):
+    engine = RollingCorrelation(returns.columns, window=30, keep_history=True)
+    for date, row in zip(returns.index[:40], returns.to_numpy()[:40]):
+        engine.append(date, row)
+
+    # one stored matrix per full window
+    assert len(engine.history) == 11
+    assert engine.matrix_at(returns.index[39]).shape == (6, 6)
+
+    drifts = [drift for _, _, drift in rolling_correlations(returns, 30)]
+    assert drifts[0] == 0.0
+    assert all(d >= 0 for d in drifts)
+
+
+def test_constant_series_correlates_with_nothing():
+    engine = RollingCorrelation(["A", "B"], window=3)
+    for i, row in enumerate([[0.01, 0.0], [0.02, 0.0], [-0.01, 0.0]]):
+        engine.append(i, row)
+
+    assert engine.correlation()[0, 1] == 0.0
+
+
+def test_daily_returns_drops_sparse_tickers_before_incomplete_days():
+    dates = pd.date_range("2024-01-01", periods=11)
+    history = pd.DataFrame({
+        "BTC": np.linspace(100, 110, 11),
+        "ETH": np.linspace(50, 60, 11),
+        # listed on the last two days only
+        "NEW": [np.nan] * 9 + [1.0, 1.1],
+    }, index=dates)
+    history.loc[dates[5], "ETH"] = np.nan
+
+    returns = daily_returns(history)
+
+    assert list(returns.columns) == ["BTC", "ETH"]
+    # ETH's gap removes the two returns touching it, NEW removes nothing
+    assert len(returns) == 8
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+import market_cache
+import price_fetcher
+from data_sources import CloseAccumulator, CsvDumpSource, ingest_dump, normalize_chunks, read_closes
+
+DAY_MS = 86_400_000
+
+
+# rows spread over tickers and days in random order, so later chunks reach back before the first bucket
+def dump(seed=0, n=5000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "symbol": rng.choice(["btc", "eth", "sol", "pepe"], n),
+        "timestamp": rng.integers(19700 * DAY_MS, 19760 * DAY_MS, n),
+        "close": rng.uniform(1, 100, n),
+    })
+
+
+# latest close per (UTC day, ticker) through a plain pandas groupby
+def groupby_closes(frame):
+    frame = frame.assign(ticker=frame["symbol"].str.upper(), day=frame["timestamp"] // DAY_MS * DAY_MS)
+    last = frame.sort_values("timestamp", kind="stable").groupby(["day", "ticker"])["close"].last()
+    closes = last.unstack()
+    closes.index = pd.to_datetime(closes.index, unit="ms")
+    return closes
+
+
+def test_accumulator_matches_a_groupby_across_chunks():
+    frame = dump()
+    # newest rows first, so every chunk grows the matrix backwards and carries older points for filled days
+    newest_first = frame.sort_values("timestamp", ascending=False)
+    accumulator = CloseAccumulator()
+    for start in range(0, len(frame), 700):
+        chunk = newest_first.iloc[start:start + 700].rename(columns={"symbol": "ticker"})
+        for tickers, ms, close in normalize_chunks([chunk]):
+            accumulator.add(tickers, ms, close)
+
+    result = accumulator.to_frame()
+    expected = groupby_closes(frame)
+
+    assert accumulator.rows_seen == len(frame)
+    pd.testing.assert_frame_equal(result[sorted(result.columns)], expected, check_names=False, check_freq=False)
+
+
+def test_csv_dump_resolves_columns_and_skips_bad_rows(tmp_path):
+    frame = dump(n=500)
+    frame["close"] = frame["close"].astype(object)
+    frame.loc[::50, "close"] = "n/a"
+    path = tmp_path / "dump.csv"
+    frame.to_csv(path, index=False)
+
+    closes = read_closes(CsvDumpSource(str(path), chunk_rows=64))
+
+    valid = frame[pd.to_numeric(frame["close"], errors="coerce").notna()].astype({"close": float})
+    expected = groupby_closes(valid)
+    pd.testing.assert_frame_equal(closes[sorted(closes.columns)], expected, check_names=False, check_freq=False)
+
+
+def test_ingest_holds_the_refresh_lock_while_merging_the_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "dump.csv"
+    dump(n=200).to_csv(path, index=False)
+
+    saved = []
+    real_save = price_fetcher.save_price_history
+
+    def save(history, *args):
+        # a concurrent refresh or ingest cannot take the lock while the merged history is written
+        saved.append(market_cache.acquire_refresh_lock(main.CACHE_DIR))
+        real_save(history, *args)
+
+    monkeypatch.setattr(price_fetcher, "save_price_history", save)
+
+    assert ingest_dump(str(path), publish=False) is None
+    assert saved == [None]
+    assert set(price_fetcher.load_price_history().columns) == {"BTC", "ETH", "SOL", "PEPE"}
+
+    # and it is released afterwards
+    token = market_cache.acquire_refresh_lock(main.CACHE_DIR)
+    assert token is not None
+    market_cache.release_refresh_lock(token, main.CACHE_DIR)
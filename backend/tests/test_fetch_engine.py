@@ -0,0 +1,130 @@
+import pytest
+import requests
+
+import fetch_engine
+from benchmark import StubMarket, start_stub
+from fetch_engine import RetryableStatus, TokenBucket, fetch_all, make_session, request_json
+from response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fetch_engine.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(fetch_engine.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_paces_to_the_rate(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_bucket_refills_while_idle(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+
+    clock.now += 10
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_request_json_retries_retryable_statuses_honouring_retry_after(clock):
+    session = FakeSession([
+        FakeResponse(429, headers={"Retry-After": "2"}),
+        FakeResponse(503),
+        FakeResponse(200, {"ok": True}),
+    ])
+
+    response = request_json(session, "http://stub/x", max_retries=3)
+
+    assert response.json() == {"ok": True}
+    assert session.calls == 3
+    assert clock.sleeps[0] == 2.0
+    # no Retry-After on the 503, so the second wait is jittered backoff for attempt 1
+    assert 0 <= clock.sleeps[1] <= fetch_engine.BACKOFF_BASE_SECONDS * 2
+
+
+def test_request_json_gives_up_after_max_retries(clock):
+    session = FakeSession([FakeResponse(500) for _ in range(3)])
+
+    with pytest.raises(RetryableStatus):
+        request_json(session, "http://stub/x", max_retries=2)
+    assert session.calls == 3
+
+
+def test_request_json_does_not_retry_client_errors(clock):
+    session = FakeSession([FakeResponse(404)])
+
+    with pytest.raises(requests.HTTPError):
+        request_json(session, "http://stub/x")
+    assert session.calls == 1
+
+
+def test_backoff_delay_is_capped():
+    assert fetch_engine.backoff_delay(50) <= fetch_engine.BACKOFF_MAX_SECONDS
+    assert fetch_engine.backoff_delay(0, retry_after=1e6) == fetch_engine.BACKOFF_MAX_SECONDS
+
+
+def test_fetch_all_against_the_stub_retries_through_throttling(tmp_path):
+    market = StubMarket({"BTC": "bitcoin", "USDC": "usd-coin"}, n_assets=2, throttle_every=3)
+    server, base_url = start_stub(market)
+    try:
+        jobs = {coin_id: (f"{base_url}/coins/{coin_id}/market_chart", {"days": 5}) for coin_id in ("bitcoin", "usd-coin")}
+        jobs["price"] = (f"{base_url}/simple/price", {"ids": "bitcoin,usd-coin"})
+
+        results = fetch_all(jobs, limiter=TokenBucket(1e6), session=make_session(), cache=ResponseCache(str(tmp_path)))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert set(results) == {"bitcoin", "usd-coin", "price"}
+    assert len(results["bitcoin"]["prices"]) == 6
+    assert set(results["price"]) == {"bitcoin", "usd-coin"}
+    # every third request was answered 429, yet all jobs succeeded
+    assert market.requests > len(jobs)
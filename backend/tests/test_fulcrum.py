@@ -0,0 +1,49 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fulcrum
+import price_fetcher
+
+CLUSTERS = pd.Series(
+    [0, 0, 1, 1, 2, 2, 3, 3],
+    index=["USDC", "DAI", "ETH", "BTC", "PEPE", "SHIB", "LINK", "UNI"],
+)
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(0, 0.02, (len(CLUSTERS), 60)), index=CLUSTERS.index)
+    monkeypatch.setattr(fulcrum, "load_generation", lambda cache_dir: (df, CLUSTERS))
+
+    # BTC and USDC price normally, ETH is known but the API returns nothing for it, FAKE is not a listed coin
+    monkeypatch.setattr(price_fetcher, "get_universe", lambda: {"BTC": "bitcoin", "USDC": "usd-coin", "ETH": "ethereum"})
+    monkeypatch.setattr(price_fetcher, "fetch_all", lambda jobs: {
+        0: {"bitcoin": {"usd": 50000.0}, "usd-coin": {"usd": 1.0}},
+    })
+    monkeypatch.setattr(price_fetcher.price_cache, "get_many", lambda symbols: {})
+
+
+def test_json_output_is_parseable_with_diagnostics_on_stderr(cached, tmp_path, capsys):
+    holdings = tmp_path / "holdings.json"
+    holdings.write_text(json.dumps({"BTC": 1, "USDC": 1000, "ETH": 2, "FAKE": 3}))
+
+    assert fulcrum.main(["portfolio", str(holdings), "--format", "json"]) == 0
+    out, err = capsys.readouterr()
+
+    summary = json.loads(out)
+    assert summary["total_value"] == pytest.approx(51000.0)
+    assert summary["unknown"] == ["FAKE"]
+    assert summary["unpriced"] == ["ETH", "FAKE"]
+    assert "unknown ticker FAKE" in err
+
+
+def test_hedge_json_reports_missing_tickers(cached, capsys):
+    assert fulcrum.main(["hedge", "btc", "--format", "json"]) == 0
+    assert json.loads(capsys.readouterr().out)["ticker"] == "BTC"
+
+    assert fulcrum.main(["hedge", "FAKE", "--format", "json"]) == 1
+    assert "error" in json.loads(capsys.readouterr().out)
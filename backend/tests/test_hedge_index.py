@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hedge_index import HedgeIndex
+
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(0)
+    market = rng.normal(0, 0.03, 120)
+    rows = {
+        "BTC": market + rng.normal(0, 0.005, 120),
+        "ETH": 1.2 * market + rng.normal(0, 0.01, 120),
+        "INV": -market + rng.normal(0, 0.01, 120),
+        "NOISE": rng.normal(0, 0.02, 120),
+        "FLAT": np.zeros(120),
+    }
+    return pd.DataFrame(rows).T
+
+
+def test_correlation_matches_numpy(returns):
+    index = HedgeIndex(returns)
+    live = returns.drop(index="FLAT")
+    expected = np.corrcoef(live.to_numpy())
+
+    for i, a in enumerate(live.index):
+        for j, b in enumerate(live.index):
+            assert index.correlation(a, b) == pytest.approx(expected[i, j], abs=1e-5)
+
+    # zero-variance assets correlate with nothing instead of producing NaN
+    assert index.correlation("BTC", "FLAT") == 0.0
+
+
+def test_queries_rank_by_correlation(returns):
+    index = HedgeIndex(returns)
+
+    assert index.most_negatively_correlated("BTC", k=1)[0][0] == "INV"
+    assert index.nearest_neighbors("BTC", k=1)[0][0] == "ETH"
+    assert index.least_correlated("BTC", k=1)[0][0] == "FLAT"
+    # the queried asset never ranks against itself
+    assert "BTC" not in [t for t, _ in index.nearest_neighbors("BTC", k=10)]
+
+
+def test_rank_hedges_orders_candidates_and_passes_unknown_tickers_through(returns):
+    index = HedgeIndex(returns)
+
+    assert index.rank_hedges("BTC", ["ETH", "NOISE", "INV", "MISSING"]) == ["INV", "NOISE", "ETH"]
+    assert index.rank_hedges("MISSING", ["ETH", "INV"], k=1) == ["ETH"]
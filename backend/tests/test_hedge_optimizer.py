@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import minimize
+
+from hedge_optimizer import HedgeOptimizer, project_capped_simplex
+
+TICKERS = ["BTC", "ETH", "PEPE", "SOL", "USDC", "DAI"]
+
+
+@pytest.fixture
+def optimizer():
+    rng = np.random.default_rng(0)
+    market = rng.normal(0, 0.03, 400)
+    returns = pd.DataFrame({
+        "BTC": market + rng.normal(0, 0.01, 400),
+        "ETH": 1.2 * market + rng.normal(0, 0.015, 400),
+        "PEPE": 2.0 * market + rng.normal(0, 0.06, 400),
+        "SOL": 1.5 * market + rng.normal(0, 0.03, 400),
+        "USDC": rng.normal(0, 0.001, 400),
+        "DAI": -0.05 * market + rng.normal(0, 0.002, 400),
+    }).T
+    return HedgeOptimizer(returns)
+
+
+# the same problem for one portfolio through scipy's SLSQP
+def slsqp(cov, weights, hedge_idx, budget):
+    def variance(x):
+        mixed = (1.0 - x.sum()) * weights
+        mixed[hedge_idx] += x
+        return mixed @ cov @ mixed
+
+    result = minimize(variance, np.zeros(len(hedge_idx)), method="SLSQP",
+                      bounds=[(0.0, None)] * len(hedge_idx),
+                      constraints=[{"type": "ineq", "fun": lambda x: budget - x.sum()}],
+                      options={"ftol": 1e-15, "maxiter": 500})
+    return result.x, result.fun
+
+
+def test_fista_matches_slsqp(optimizer):
+    weights = np.array([
+        [0.5, 0.3, 0.2, 0.0, 0.0, 0.0],
+        [0.0, 0.0, 0.6, 0.4, 0.0, 0.0],
+        [0.2, 0.2, 0.2, 0.2, 0.1, 0.1],
+    ])
+    hedges = ["USDC", "DAI", "BTC"]
+    hedge_idx = [TICKERS.index(t) for t in hedges]
+
+    for budget in (0.25, 1.0):
+        x, before, after = optimizer.optimize(weights, hedges, max_turnover=budget, max_iter=5000)
+
+        for row, w in enumerate(weights):
+            expected_x, expected_after = slsqp(optimizer.cov, w, hedge_idx, budget)
+
+            assert before[row] == pytest.approx(w @ optimizer.cov @ w)
+            assert after[row] == pytest.approx(expected_after, rel=1e-4, abs=1e-10)
+            np.testing.assert_allclose(x[row], expected_x, atol=2e-3)
+            assert x[row].sum() <= budget + 1e-9
+
+
+def test_projection_onto_the_capped_simplex():
+    x = np.array([[0.5, -0.2, 0.1], [0.9, 0.8, 0.3], [0.0, 0.0, 0.0]])
+
+    projected = project_capped_simplex(x, 1.0)
+
+    np.testing.assert_allclose(projected[0], [0.5, 0.0, 0.1])
+    np.testing.assert_allclose(projected[1], [0.55, 0.45, 0.0])
+    assert (projected >= 0).all() and (projected.sum(axis=1) <= 1.0 + 1e-12).all()
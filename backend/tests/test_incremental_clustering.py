@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from incremental_clustering import can_warm_start, match_labels, warm_start_kmeans
+
+
+# four well separated blobs of 10 tickers each
+def blobs(seed=0, shift=0.0):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(4, 6) * 5
+    matrix = np.vstack([rng.normal(center + shift, 0.1, (10, 6)) for center in centers])
+    return pd.DataFrame(matrix, index=[f"T{i}" for i in range(40)])
+
+
+@pytest.fixture
+def fixed_k(monkeypatch, tmp_path):
+    # snapshots and the chosen k are written under the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "AUTO_K", False)
+
+
+def test_match_labels_undoes_a_permutation():
+    old = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]])
+    new = old[[2, 0, 1]] + 0.1
+
+    assert match_labels(old, new).tolist() == [2, 0, 1]
+
+
+def test_warm_start_keeps_the_previous_ids():
+    df = blobs()
+    # previous ids are an arbitrary permutation of the blob order
+    previous = pd.Series(np.repeat([2, 0, 3, 1], 10), index=df.index)
+
+    _, clustered = warm_start_kmeans(blobs(seed=1, shift=0.05), previous, 4, random_state=0)
+
+    assert (clustered == previous).all()
+
+
+def test_warm_start_needs_overlapping_in_range_labels():
+    df = blobs()
+    assert not can_warm_start(df, None, 4)
+    assert not can_warm_start(df, pd.Series([0], index=["OTHER"]), 4)
+    assert not can_warm_start(df, pd.Series(np.full(40, 5), index=df.index), 4)
+    assert can_warm_start(df, pd.Series(np.zeros(40), index=df.index), 4)
+
+
+def test_snapshot_from_a_cold_fit_is_aligned_to_the_previous_ids(fixed_k):
+    df = blobs()
+    _, cold = main.fit_model(df)
+
+    previous = pd.Series((cold.to_numpy() + 1) % 4, index=df.index)
+    _, warm = main.fit_model(df, previous_clusters=previous)
+
+    assert (warm == previous).all()
+
+
+def test_ids_stay_stable_across_daily_refits(fixed_k):
+    _, yesterday = main.fit_model(blobs(seed=0))
+    _, today = main.fit_model(blobs(seed=1, shift=0.05), previous_clusters=yesterday)
+
+    assert (today == yesterday).all()
+
+
+def test_large_universes_warm_start_with_minibatch(fixed_k, monkeypatch):
+    from sklearn.cluster import MiniBatchKMeans
+
+    monkeypatch.setattr(main, "MINIBATCH_THRESHOLD", 10)
+    _, yesterday = main.fit_model(blobs(seed=0))
+    model, today = main.fit_model(blobs(seed=1, shift=0.05), previous_clusters=yesterday)
+
+    assert isinstance(model, MiniBatchKMeans)
+    assert (today == yesterday).all()
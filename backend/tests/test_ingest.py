@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from ingest import payloads_to_frame, resample_closes, to_epoch_arrays
+
+DAY_MS = 86_400_000
+HOUR_MS = 3_600_000
+
+
+# irregular intraday points for a few days, some out of order
+def payload(seed, days=5):
+    rng = np.random.default_rng(seed)
+    ms = np.sort(rng.integers(0, days * DAY_MS, 200))
+    points = [[int(t), float(p)] for t, p in zip(ms, rng.uniform(1, 100, len(ms)))]
+    points[10], points[40] = points[40], points[10]
+    return points
+
+
+# the per-ticker pandas groupby the vectorized path replaced
+def groupby_closes(prices, width):
+    columns = {}
+    for ticker, points in prices.items():
+        frame = pd.DataFrame(points, columns=["ms", "price"]).sort_values("ms", kind="stable")
+        closes = frame.groupby(frame["ms"] // width * width)["price"].last()
+        columns[ticker] = closes
+    frame = pd.DataFrame(columns).sort_index()
+    frame.index = pd.to_datetime(frame.index, unit="ms")
+    return frame
+
+
+def test_daily_and_hourly_closes_match_a_groupby():
+    prices = {"BTC": payload(0), "ETH": payload(1, days=3), "EMPTY": []}
+
+    for granularity, width in (("daily", DAY_MS), ("hourly", HOUR_MS)):
+        frame = payloads_to_frame(prices, granularity)
+        expected = groupby_closes({t: p for t, p in prices.items() if p}, width)
+
+        assert list(frame.columns) == ["BTC", "ETH"]
+        np.testing.assert_array_equal(frame.index.to_numpy(), expected.index.to_numpy())
+        np.testing.assert_allclose(frame.to_numpy(), expected.to_numpy())
+
+
+def test_day_buckets_close_at_midnight_utc():
+    ms, prices = to_epoch_arrays([[DAY_MS - 1, 1.0], [DAY_MS, 2.0], [DAY_MS + 5, 3.0]])
+
+    buckets, closes = resample_closes(ms, prices)
+
+    assert buckets.tolist() == [0, DAY_MS]
+    assert closes.tolist() == [1.0, 3.0]
+
+
+def test_no_points_give_an_empty_frame():
+    assert payloads_to_frame({}).empty
+    assert payloads_to_frame({"BTC": []}).empty
@@ -0,0 +1,60 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import k_selection
+from k_selection import choose_k, select_k
+from model_store import prune_snapshots
+
+
+# five well separated blobs of 8 tickers each
+def blobs(seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(5, 6) * 5
+    matrix = np.vstack([rng.normal(center, 0.1, (8, 6)) for center in centers])
+    return pd.DataFrame(matrix, index=[f"T{i}" for i in range(40)])
+
+
+def score(k, silhouette, gap, gap_std=0.1):
+    return {"k": k, "inertia": 1.0, "silhouette": silhouette, "gap": gap, "gap_std": gap_std}
+
+
+def test_choose_k_by_silhouette_and_gap():
+    scores = [score(4, 0.3, 1.0), score(5, 0.6, 1.5), score(6, 0.4, 1.55)]
+
+    assert choose_k(scores, "silhouette") == 5
+    # 5 is within one standard error of 6, so the gap rule stops there
+    assert choose_k(scores, "gap") == 5
+    # without any silhouette the choice falls back to the gap statistic
+    assert choose_k([{**s, "silhouette": np.nan} for s in scores], "silhouette") == 5
+
+    with pytest.raises(ValueError):
+        choose_k(scores, "elbow")
+
+
+def test_select_k_finds_the_blobs_and_caches_the_scores(tmp_path, monkeypatch):
+    df = blobs()
+
+    k, scores = select_k(df, k_min=4, k_max=6, n_refs=2, max_workers=2, model_dir=tmp_path)
+    assert k == 5
+    assert [s["k"] for s in scores] == [4, 5, 6]
+    assert len(glob.glob(os.path.join(tmp_path, "k-*.json"))) == 1
+
+    # a second call is served from the cache without starting any workers
+    monkeypatch.setattr(k_selection, "ProcessPoolExecutor", None)
+    assert select_k(df, k_min=4, k_max=6, n_refs=2, model_dir=tmp_path) == (k, scores)
+
+
+def test_prune_snapshots_keeps_the_newest_k_scores(tmp_path):
+    for i in range(4):
+        path = tmp_path / f"k-{i}.json"
+        path.write_text("{}")
+        os.utime(path, (i, i))
+    (tmp_path / "kmeans-0.pkl").write_bytes(b"")
+
+    prune_snapshots(tmp_path, keep=2)
+
+    assert sorted(os.listdir(tmp_path)) == ["k-2.json", "k-3.json", "kmeans-0.pkl"]
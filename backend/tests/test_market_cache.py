@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_cache
+from market_cache import (LOCK_FILE, acquire_refresh_lock, cache_age, current_generation, load_generation,
+                          publish_generation, release_refresh_lock)
+
+
+def returns_frame(seed=0):
+    dates = pd.date_range("2024-01-01", periods=5)
+    values = np.random.default_rng(seed).normal(size=(3, 5))
+    return pd.DataFrame(values, index=["BTC", "ETH", "USDC"], columns=dates)
+
+
+def test_empty_cache_has_no_generation(tmp_path):
+    assert cache_age(str(tmp_path)) is None
+    assert load_generation(str(tmp_path)) == (None, None)
+
+
+def test_publish_then_load_round_trips_returns_and_clusters(tmp_path):
+    df = returns_frame()
+    clusters = pd.Series([1, 1, 0], index=df.index)
+
+    publish_generation(df, clusters, str(tmp_path))
+    loaded, loaded_clusters = load_generation(str(tmp_path))
+
+    assert list(loaded.index) == list(df.index)
+    np.testing.assert_allclose(loaded.to_numpy(), df.to_numpy(), rtol=1e-6)
+    assert loaded_clusters.to_dict() == {"BTC": 1, "ETH": 1, "USDC": 0}
+
+
+def test_publish_swaps_the_pointer_and_prunes_old_generations(tmp_path):
+    first = publish_generation(returns_frame(0), None, str(tmp_path))
+    readers_view, _ = load_generation(str(tmp_path))
+
+    for seed in range(1, 4):
+        latest = publish_generation(returns_frame(seed), None, str(tmp_path))
+
+    assert current_generation(str(tmp_path)) == latest
+    generations = [name for name in os.listdir(tmp_path) if name.startswith("gen-")]
+    assert len(generations) == market_cache.KEEP_GENERATIONS
+    assert not os.path.exists(first)
+
+    # a reader still holding the first generation's memory map keeps its data
+    np.testing.assert_allclose(readers_view.to_numpy(), returns_frame(0).to_numpy(), rtol=1e-6)
+
+
+def test_abandoned_build_directories_are_removed(tmp_path):
+    stale = tmp_path / "tmp-gen-1"
+    fresh = tmp_path / "tmp-gen-2"
+    stale.mkdir()
+    fresh.mkdir()
+    os.utime(stale, (0, 0))
+
+    publish_generation(returns_frame(), None, str(tmp_path))
+
+    assert not stale.exists()
+    # may belong to a publish still in progress
+    assert fresh.exists()
+
+
+def test_lock_is_exclusive_until_released(tmp_path):
+    token = acquire_refresh_lock(str(tmp_path))
+    assert token is not None
+    assert acquire_refresh_lock(str(tmp_path)) is None
+
+    assert release_refresh_lock(token, str(tmp_path))
+    assert acquire_refresh_lock(str(tmp_path)) is not None
+
+
+def test_lock_is_released_when_its_holder_dies(tmp_path):
+    token = acquire_refresh_lock(str(tmp_path))
+
+    # closing the descriptor without releasing is what the kernel does for a crashed process
+    os.close(token)
+
+    assert acquire_refresh_lock(str(tmp_path)) is not None
+
+
+def test_long_running_holder_keeps_the_lock(tmp_path):
+    token = acquire_refresh_lock(str(tmp_path))
+    os.utime(tmp_path / LOCK_FILE, (0, 0))
+
+    # however old the lock file looks, nobody takes the lock over from a live holder
+    assert acquire_refresh_lock(str(tmp_path)) is None
+    assert release_refresh_lock(token, str(tmp_path))
+
+
+def test_cold_cache_refresh_failure_is_raised(tmp_path, monkeypatch):
+    import main
+
+    def failing_generate_df():
+        raise ConnectionError("API unreachable")
+
+    monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "generate_df", failing_generate_df)
+
+    with pytest.raises(ConnectionError):
+        main.get_market_data()
+    assert acquire_refresh_lock(str(tmp_path)) is not None
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from portfolio_visualizer import ScatterplotRenderer
+
+
+def renderer():
+    rng = np.random.default_rng(0)
+    tickers = [f"T{i}" for i in range(12)]
+    df = pd.DataFrame(rng.normal(0, 0.02, (12, 30)), index=tickers)
+    return ScatterplotRenderer(df, pd.Series(np.arange(12) % 4, index=tickers))
+
+
+def test_svg_output_is_vector_and_png_is_raster(tmp_path):
+    plot = renderer()
+
+    svg = plot.render(["T1", "T2"], str(tmp_path / "plot.svg"), dpi=50)
+    text = open(svg).read()
+    assert "<image" not in text
+    # the highlighted tickers are drawn as text glyphs, not pixels
+    assert "<!-- T1 -->" in text
+
+    png = plot.render(["T1", "T2"], str(tmp_path / "plot.png"), dpi=50)
+    assert open(png, "rb").read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+def test_the_portfolio_layer_does_not_leak_into_later_renders(tmp_path):
+    plot = renderer()
+    before = len(plot.ax.get_children())
+
+    plot.render(["T1"], str(tmp_path / "a.svg"), dpi=50)
+    plot.render(["T3"], str(tmp_path / "b.png"), dpi=50)
+
+    assert len(plot.ax.get_children()) == before
+    assert plot.ax.get_legend() is None
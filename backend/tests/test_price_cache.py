@@ -0,0 +1,48 @@
+import pytest
+
+import price_cache
+from price_cache import TTLCache
+
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(price_cache.time, "monotonic", lambda: clock["now"])
+    return clock
+
+
+def test_entries_expire_after_the_ttl(now):
+    cache = TTLCache(ttl=10)
+    cache.set("BTC", 100.0)
+
+    now["now"] = 9.9
+    assert cache.get("BTC") == 100.0
+
+    now["now"] = 10.1
+    assert cache.get("BTC") is None
+    assert "BTC" not in cache.entries
+
+
+def test_least_recently_used_entry_is_evicted(now):
+    cache = TTLCache(ttl=10, max_entries=2)
+    cache.set("BTC", 1.0)
+    cache.set("ETH", 2.0)
+
+    # touching BTC makes ETH the least recently used
+    assert cache.get("BTC") == 1.0
+    cache.set("SOL", 3.0)
+
+    assert cache.get_many(["BTC", "ETH", "SOL"]) == {"BTC": 1.0, "SOL": 3.0}
+
+
+def test_named_cache_counts_hits_and_misses(now):
+    import metrics
+    metrics.reset()
+
+    cache = TTLCache(name="quotes")
+    cache.set_many({"BTC": 1.0})
+    cache.get_many(["BTC", "ETH"])
+
+    counters = metrics.snapshot()["counters"]
+    assert counters["quotes_hits"] == 1
+    assert counters["quotes_misses"] == 1
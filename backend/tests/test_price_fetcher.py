@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_fetcher import compute_returns
+
+
+@pytest.fixture
+def history():
+    dates = pd.date_range("2024-01-01", periods=11)
+    return pd.DataFrame({
+        "BTC": 100 * 1.01 ** np.arange(11),
+        "ETH": 50 * 1.02 ** np.arange(11),
+        # listed on the last three days only
+        "NEW": [np.nan] * 8 + [1.0, 2.0, 4.0],
+    }, index=dates)
+
+
+def test_returns_are_one_row_per_ticker_over_the_window(history):
+    returns = compute_returns(history, window=10, tickers=["BTC", "ETH", "MISSING"])
+
+    assert list(returns.index) == ["BTC", "ETH"]
+    assert returns.shape == (2, 10)
+    np.testing.assert_allclose(returns.loc["BTC"], 0.01)
+    np.testing.assert_allclose(returns.loc["ETH"], 0.02)
+
+
+def test_a_gap_only_fills_that_tickers_day(history):
+    history.loc[history.index[5], "ETH"] = np.nan
+
+    returns = compute_returns(history, window=10, tickers=["BTC", "ETH"])
+
+    # the date stays for BTC, ETH's two missing returns get its own mean instead of 0%
+    assert returns.shape == (2, 10)
+    np.testing.assert_allclose(returns.loc["BTC"], 0.01)
+    assert not returns.loc["ETH"].isna().any()
+    assert (returns.loc["ETH"] > 0).all()
+
+
+def test_tickers_below_the_coverage_threshold_are_dropped(history):
+    assert "NEW" not in compute_returns(history, window=10, tickers=["BTC", "NEW"]).index
+    assert "NEW" in compute_returns(history, window=10, min_coverage=0.2, tickers=["BTC", "NEW"]).index
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import price_fetcher
+from fetch_engine import fetch_json
+from response_cache import OfflineCacheMiss, ResponseCache
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, payloads):
+        self.payloads = list(payloads)
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls += 1
+        return FakeResponse(self.payloads.pop(0))
+
+
+def test_fetch_json_serves_fresh_entries_and_replays_offline(tmp_path):
+    url, params = "http://stub/simple/price", {"ids": "bitcoin", "x_cg_demo_api_key": "secret"}
+    session = FakeSession([{"bitcoin": {"usd": 1.0}}])
+    cache = ResponseCache(str(tmp_path))
+
+    assert fetch_json(session, url, params, cache=cache) == {"bitcoin": {"usd": 1.0}}
+    assert fetch_json(session, url, params, cache=cache) == {"bitcoin": {"usd": 1.0}}
+    assert session.calls == 1
+
+    offline = ResponseCache(str(tmp_path), offline=True)
+    # the API key is not part of the cache key
+    assert fetch_json(FakeSession([]), url, {"ids": "bitcoin"}, cache=offline) == {"bitcoin": {"usd": 1.0}}
+    with pytest.raises(OfflineCacheMiss):
+        fetch_json(FakeSession([]), url, {"ids": "ethereum"}, cache=offline)
+
+
+def test_prune_drops_expired_entries_then_the_oldest_beyond_the_cap(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age=100, max_entries=2)
+    for i in range(5):
+        cache.put("http://stub/simple/price", {"ids": f"coin{i}"}, {})
+
+    paths = [cache.path(cache.key("http://stub/simple/price", {"ids": f"coin{i}"})) for i in range(5)]
+    now = os.path.getmtime(paths[-1])
+    for i, path in enumerate(paths):
+        # coin0 is past max_age, the rest are one second apart
+        os.utime(path, (now - 1000 if i == 0 else now - 10 + i,) * 2)
+
+    assert cache.prune() == 3
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths[3:])
+
+
+def test_the_first_write_prunes(tmp_path):
+    stale = tmp_path / "stale.json"
+    stale.write_text("{}")
+    os.utime(stale, (0, 0))
+
+    ResponseCache(str(tmp_path)).put("http://stub/simple/price", {"ids": "bitcoin"}, {})
+
+    assert not stale.exists()
+
+
+def test_spot_price_batches_do_not_depend_on_the_request_order(monkeypatch):
+    universe = {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana"}
+    monkeypatch.setattr(price_fetcher, "get_universe", lambda: universe)
+
+    requested = []
+    monkeypatch.setattr(price_fetcher, "fetch_all", lambda jobs: requested.append(list(jobs.values())) or {})
+
+    price_fetcher.fetch_spot_prices(["SOL", "BTC", "ETH"], batch_size=2)
+    price_fetcher.fetch_spot_prices(["ETH", "SOL", "BTC"], batch_size=2)
+
+    assert requested[0] == requested[1]
+    assert [params["ids"] for _, params in requested[0]] == ["bitcoin,ethereum", "solana"]
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from returns_matrix import ReturnsMatrix, as_returns_matrix
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2024-01-01", periods=10)
+    return pd.DataFrame(rng.normal(0, 0.02, (5, 10)), index=["BTC", "ETH", "SOL", "PEPE", "USDC"], columns=dates)
+
+
+def test_round_trips_a_returns_frame(frame):
+    matrix = as_returns_matrix(frame)
+
+    assert matrix.shape == (5, 10) and len(matrix) == 5
+    assert matrix.to_numpy().dtype == np.float32
+    assert "ETH" in matrix and "FAKE" not in matrix
+    pd.testing.assert_frame_equal(matrix.to_frame(), frame.astype(np.float32), check_names=False)
+    # a 'Ticker' column (the old CSV layout) is taken as the index
+    assert as_returns_matrix(frame.reset_index(names="Ticker")).tickers == matrix.tickers
+    assert as_returns_matrix(matrix) is matrix
+
+
+def test_windows_and_contiguous_subsets_are_views(frame):
+    matrix = as_returns_matrix(frame)
+
+    window = matrix.window(frame.columns[2], frame.columns[5])
+    assert list(window.dates) == list(frame.columns[2:6])
+    assert np.shares_memory(window.values, matrix.values)
+    assert np.shares_memory(matrix.tail(3).values, matrix.values)
+
+    run = matrix.subset(["ETH", "SOL", "PEPE"])
+    assert run.tickers == ("ETH", "SOL", "PEPE")
+    assert np.shares_memory(run.values, matrix.values)
+
+    # out of order (and unknown) tickers are gathered into a copy, in the order asked for
+    gathered = matrix.subset(["USDC", "FAKE", "BTC"])
+    assert gathered.tickers == ("USDC", "BTC")
+    np.testing.assert_array_equal(gathered.values, frame.loc[["USDC", "BTC"]].to_numpy(dtype=np.float32))
+    assert not np.shares_memory(gathered.values, matrix.values)
+
+
+def test_mask_matches_isin_and_shapes_are_checked(frame):
+    matrix = as_returns_matrix(frame)
+
+    np.testing.assert_array_equal(matrix.mask(["SOL", "BTC", "FAKE"]), frame.index.isin(["SOL", "BTC"]))
+
+    with pytest.raises(ValueError):
+        ReturnsMatrix(np.zeros((2, 3)), ["BTC"])
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from risk_engine import RiskEngine, _cholesky
+
+
+@pytest.fixture
+def engine():
+    rng = np.random.default_rng(0)
+    market = rng.normal(0, 0.03, 500)
+    returns = pd.DataFrame({
+        "BTC": market + rng.normal(0, 0.01, 500),
+        "ETH": 1.3 * market + rng.normal(0, 0.015, 500),
+        "PEPE": rng.normal(0.001, 0.08, 500),
+        "USDC": np.zeros(500),
+    }).T
+    return RiskEngine(returns)
+
+
+def test_risk_shares_sum_to_one(engine):
+    tickers = ["BTC", "ETH", "PEPE", "USDC"]
+    weights = np.array([0.4, 0.3, 0.2, 0.1])
+
+    marginal, shares = engine.risk_contributions(tickers, weights)
+
+    assert sum(shares.values()) == pytest.approx(1.0)
+    assert shares["USDC"] == pytest.approx(0.0, abs=1e-12)
+    # the most volatile holding carries more of the risk than of the capital
+    assert shares["PEPE"] > 0.2
+
+
+def test_var_measures_agree_and_cvar_exceeds_var(engine):
+    tickers = ["BTC", "ETH", "PEPE"]
+    weights = np.array([0.5, 0.3, 0.2])
+
+    parametric = engine.parametric_var(tickers, weights)
+    historical = engine.historical_var(tickers, weights)
+    monte_carlo = engine.monte_carlo_var(tickers, weights, n_paths=200_000, max_workers=1)
+
+    for var, cvar in (parametric, historical, monte_carlo):
+        assert 0 < var < cvar
+    # the simulation draws from the same normal model the parametric measure assumes
+    assert monte_carlo[0] == pytest.approx(parametric[0], rel=0.05)
+    assert historical[0] == pytest.approx(parametric[0], rel=0.25)
+
+
+def test_report_skips_unknown_and_unpriced_holdings(engine):
+    report = engine.report({"BTC": 1, "FAKE": 5, "ETH": 2}, {"BTC": 100.0, "FAKE": 1.0})
+
+    assert report["total_value"] == pytest.approx(100.0)
+    assert list(report["risk_contribution"]) == ["BTC"]
+    assert engine.report({"FAKE": 1}, {"FAKE": 1.0}) is None
+
+
+def test_cholesky_handles_singular_and_rejects_non_finite_covariance():
+    singular = np.array([[1.0, 1.0], [1.0, 1.0]])
+    factor = _cholesky(singular)
+    np.testing.assert_allclose(factor @ factor.T, singular, atol=1e-5)
+
+    with pytest.raises(ValueError):
+        _cholesky(np.array([[np.nan, 0.0], [0.0, 1.0]]))
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import service
+from service import AnalysisService, AnalysisState, HttpError, parse_content_length, read_request
+
+CLUSTERS = pd.Series(
+    [0, 0, 1, 1, 2, 2, 3, 3],
+    index=["USDC", "DAI", "ETH", "BTC", "PEPE", "SHIB", "LINK", "UNI"],
+)
+PRICES = {"USDC": 1.0, "DAI": 1.0, "ETH": 2000.0, "BTC": 50000.0, "PEPE": 1e-5, "SHIB": 2e-5, "LINK": 10.0, "UNI": 5.0}
+
+
+@pytest.fixture
+def state():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(0, 0.02, (len(CLUSTERS), 60)), index=CLUSTERS.index)
+    return AnalysisState(df, CLUSTERS, "gen-1")
+
+
+def request(raw):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(read())
+
+
+def test_read_request_parses_the_body():
+    body = json.dumps({"holdings": {"BTC": 1}}).encode()
+    raw = b"POST /portfolio HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+
+    assert request(raw) == ("POST", "/portfolio", {"content-length": str(len(body))}, body)
+
+
+@pytest.mark.parametrize("value, status", [("abc", 400), ("-5", 400), ("1.5", 400), (str(10 ** 7), 413)])
+def test_bad_content_lengths_are_rejected(value, status):
+    with pytest.raises(HttpError) as error:
+        parse_content_length(value)
+    assert error.value.status == status
+
+    with pytest.raises(HttpError):
+        request(f"POST /portfolio HTTP/1.1\r\nContent-Length: {value}\r\n\r\n".encode())
+
+
+def test_portfolio_and_hedge_routes(state, monkeypatch):
+    monkeypatch.setattr(service, "get_curr_prices", lambda tickers: {t: PRICES[t] for t in tickers if t in PRICES})
+    app = AnalysisService(state)
+
+    status, summary = asyncio.run(app.handle("POST", "/portfolio", b'{"holdings": {"BTC": 1, "USDC": 1000, "FAKE": 2}}'))
+    assert status == 200
+    assert summary["total_value"] == pytest.approx(51000.0)
+    assert summary["unknown"] == ["FAKE"]
+
+    status, hedge = asyncio.run(app.handle("GET", "/hedge/btc", b""))
+    assert status == 200 and hedge["ticker"] == "BTC"
+
+    with pytest.raises(HttpError):
+        asyncio.run(app.handle("GET", "/hedge/FAKE", b""))
+
+
+def test_reload_reuses_the_market_data_it_loaded(state, monkeypatch):
+    loads = []
+    monkeypatch.setattr(service, "get_market_data", lambda: loads.append(1) or (state.df, CLUSTERS))
+    monkeypatch.setattr(service, "current_generation", lambda cache_dir: "gen-2")
+    monkeypatch.setattr(service, "train_model", lambda df, previous_clusters=None: previous_clusters)
+    app = AnalysisService(state)
+
+    assert app.reload_if_changed()
+    assert app.state.generation == "gen-2"
+    assert len(loads) == 1